@@ -0,0 +1,91 @@
+"""Latencia de las búsquedas puntuales mientras otros clientes exportan tablas enteras.
+
+    python -m benchmarks.admission --workers 4 --exporters 8
+    python -m benchmarks.admission --database-url postgresql://localhost/bench
+
+Arranca gunicorn dos veces sobre la misma base de datos: sin límites y con
+RATELIMIT_ENABLED=1 (estado compartido en SQLite, sólo topes de concurrencia
+CONCURRENCY_LIMITS; la carga sale toda de la misma IP, así que no se aplican
+token buckets). En las dos, --exporters usuarios piden /people?stream=1 en
+bucle y --lookups usuarios piden /people/<id>; se informa p50/p99 de cada
+grupo y cuántas exportaciones se rechazaron (503).
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import threading
+import subprocess
+from .loadgen import run_load, wait_for_port
+from .seed import add_arguments as add_seed_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_mixed(port, options):
+    lookup_paths = [f'/people/{i}' for i in range(1, 201)]
+    results = {}
+
+    def load(name, paths, concurrency):
+        results[name] = run_load('127.0.0.1', port, paths, concurrency=concurrency, duration=options.duration)
+
+    threads = [threading.Thread(target=load, args=('exports', ['/people?stream=1'], options.exporters)),
+               threading.Thread(target=load, args=('lookups', lookup_paths, options.lookups))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def gunicorn_run(env, options):
+    command = [sys.executable, '-m', 'gunicorn', 'src.wsgi:application', '-w', str(options.workers),
+               '-b', f'127.0.0.1:{options.port}', '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port('127.0.0.1', options.port):
+            raise RuntimeError("gunicorn did not start")
+        run_load('127.0.0.1', options.port, ['/people/1'], concurrency=2, duration=1)  # calentamiento
+        return run_mixed(options.port, options)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Reuse/seed this database instead of a temporary SQLite file')
+    add_seed_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--exporters', type=int, default=8)
+    parser.add_argument('--lookups', type=int, default=4)
+    parser.add_argument('--concurrency-limits', default='list=2,export=1')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8791)
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database_url = options.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_DEBUG='0', RATELIMIT_ENABLED='0')
+    seed_command = [sys.executable, '-m', 'benchmarks.seed', '--database-url', database_url]
+    for name in ('characters', 'planets', 'vehicles', 'users', 'favorites_per_user', 'seed'):
+        seed_command += ['--' + name.replace('_', '-'), str(getattr(options, name))]
+    subprocess.run(seed_command, cwd=ROOT, env=dict(env, APP_ROLE='full'), capture_output=True, check=True)
+    env['APP_ROLE'] = 'api'
+
+    limited = dict(env, RATELIMIT_ENABLED='1', RATELIMIT_STORAGE='sqlite',
+                   RATELIMIT_STORAGE_URL=os.path.join(directory, 'ratelimit.db'),
+                   RATE_LIMITS='', CONCURRENCY_LIMITS=options.concurrency_limits)
+    report = {
+        'workers': options.workers,
+        'exporters': options.exporters,
+        'lookups': options.lookups,
+        'unlimited': gunicorn_run(env, options),
+        'limited': dict(gunicorn_run(limited, options), concurrency_limits=options.concurrency_limits),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
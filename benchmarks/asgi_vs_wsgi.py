@@ -0,0 +1,75 @@
+"""Compara el modo WSGI (gunicorn, workers sync) con el ASGI (uvicorn + engine async)
+con muchas conexiones concurrentes contra la misma base de datos.
+
+    python -m benchmarks.asgi_vs_wsgi --concurrency 500 --duration 15 --workers 2
+
+Necesita gunicorn, uvicorn y aiosqlite (o asyncpg con --database-url de Postgres).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from .loadgen import run_load, wait_for_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ('/people?limit=20', '/people/1', '/planets?limit=20', '/vehicles/2', '/users/favorites')
+
+
+def seed(database_url, rows):
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import insert
+    from src.app import app
+    from src.models import db, User, Character, Planet, Vehicle, FavoriteCharacter
+
+    with app.app_context():
+        db.create_all()
+        if User.query.first() is None:
+            db.session.add(User(username='bench', email='bench@example.com', password='x'))
+            db.session.execute(insert(Character), [{'name': f'Character {i}'} for i in range(rows)])
+            db.session.execute(insert(Planet), [{'name': f'Planet {i}'} for i in range(rows)])
+            db.session.execute(insert(Vehicle), [{'name': f'Vehicle {i}'} for i in range(rows)])
+            db.session.execute(insert(FavoriteCharacter), [{'user_id': 1, 'character_id': i} for i in range(1, 51)])
+            db.session.commit()
+
+
+def serve_and_measure(command, port, env, options):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port('127.0.0.1', port):
+            raise RuntimeError(f"server did not start: {' '.join(command)}")
+        time.sleep(1)
+        run_load('127.0.0.1', port, PATHS, concurrency=min(10, options.concurrency), duration=2)  # calentamiento
+        return run_load('127.0.0.1', port, PATHS, concurrency=options.concurrency, duration=options.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10.0)
+    options = parser.parse_args()
+
+    database_url = options.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed(database_url, options.rows)
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_DEBUG='0')
+
+    results = {'concurrency': options.concurrency, 'workers': options.workers, 'paths': list(PATHS)}
+    results['wsgi'] = serve_and_measure(
+        ['gunicorn', 'src.wsgi:application', '-w', str(options.workers), '-b', '127.0.0.1:8771'], 8771, env, options)
+    results['asgi'] = serve_and_measure(
+        ['uvicorn', 'src.asgi:application', '--workers', str(options.workers), '--port', '8772', '--log-level', 'warning'],
+        8772, env, options)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
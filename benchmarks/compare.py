@@ -0,0 +1,70 @@
+"""Compara dos informes de `benchmarks.suite` (p. ej. de dos commits).
+
+    python -m benchmarks.compare results/antes.json results/despues.json --threshold 10
+
+Muestra p50/p95/p99 y peticiones/s de cada ruta y termina con código 1 si
+alguna empeora más que --threshold por ciento en p95 o en peticiones/s.
+"""
+import sys
+import json
+import argparse
+
+
+def _change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+def _sections(report):
+    yield 'in_process', report.get('in_process', {})
+    yield 'gunicorn', report.get('gunicorn', {}).get('paths', {})
+
+def compare(old, new, threshold):
+    regressions = []
+    rows = []
+    for section, routes in _sections(new):
+        old_routes = dict(_sections(old)).get(section, {})
+        for name, result in routes.items():
+            before = old_routes.get(name)
+            if before is None:
+                continue
+            p95 = _change(before['p95_ms'], result['p95_ms'])
+            rps = _change(before['requests_per_sec'], result['requests_per_sec'])
+            rows.append((f"{section}:{name}", before, result, p95, rps))
+            if (p95 is not None and p95 > threshold) or (rps is not None and -rps > threshold):
+                regressions.append(f"{section}:{name}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed slowdown in percent')
+    options = parser.parse_args()
+
+    with open(options.old) as handle:
+        old = json.load(handle)
+    with open(options.new) as handle:
+        new = json.load(handle)
+
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'route':<45} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'req/s':>19} {'Δp95':>7}")
+    rows, regressions = compare(old, new, options.threshold)
+    for name, before, after, p95, _ in rows:
+        columns = [f"{before[key]:>7} → {after[key]:<7}" for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        columns.append(f"{before['requests_per_sec']:>8} → {after['requests_per_sec']:<8}")
+        print(f"{name:<45} {' '.join(columns)} {'' if p95 is None else f'{p95:+.0f}%':>7}")
+
+    for key in ('in_process_peak_rss_mb',):
+        print(f"{key}: {old.get(key)} → {new.get(key)}")
+    print(f"gunicorn peak_rss_mb: {old.get('gunicorn', {}).get('peak_rss_mb')} → "
+          f"{new.get('gunicorn', {}).get('peak_rss_mb')}")
+
+    if regressions:
+        print(f"\nRegressions over {options.threshold:g}%: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
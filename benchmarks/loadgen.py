@@ -0,0 +1,118 @@
+"""Generador de carga HTTP/1.1 mínimo sobre asyncio (sin dependencias externas).
+
+Cada "usuario" virtual mantiene una conexión keep-alive y lanza peticiones
+GET en bucle hasta que se acaba el tiempo.
+"""
+import time
+import asyncio
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    to_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+    }
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value.strip())
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+        elif name == b"connection" and b"close" in value.lower():
+            keep_alive = False
+    if chunked:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _user(host, port, paths, deadline, latencies, errors, offset):
+    reader = writer = None
+    index = offset
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+            latencies.append((path, time.perf_counter() - start))
+            if status >= 500:
+                errors[0] += 1
+            if not keep_alive:
+                # gunicorn con workers sync cierra la conexión tras cada respuesta
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors[0] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def _run(host, port, paths, concurrency, duration, per_path):
+    latencies, errors = [], [0]
+    deadline = time.monotonic() + duration
+    start = time.monotonic()
+    await asyncio.gather(*[
+        _user(host, port, paths, deadline, latencies, errors, offset)
+        for offset in range(concurrency)
+    ])
+    elapsed = time.monotonic() - start
+    summary = summarize([latency for _, latency in latencies], errors[0], elapsed)
+    if per_path:
+        # Los errores de conexión no se pueden atribuir a una ruta: sólo van en el total
+        by_path = {}
+        for path, latency in latencies:
+            by_path.setdefault(path, []).append(latency)
+        summary['paths'] = {path: summarize(values, 0, elapsed) for path, values in by_path.items()}
+    return summary
+
+
+def run_load(host, port, paths, concurrency=50, duration=10.0, per_path=False):
+    return asyncio.run(_run(host, port, list(paths), concurrency, duration, per_path))
+
+
+def wait_for_port(host, port, timeout=30.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
@@ -0,0 +1,130 @@
+"""Crea y llena una base de datos de benchmark con volúmenes configurables.
+
+    python -m benchmarks.seed --database-url sqlite:////tmp/bench.db
+    python -m benchmarks.seed --database-url postgresql://localhost/bench --characters 100000 --users 10000
+
+Aplica las migraciones (mismo esquema e índices que producción) y genera
+datos deterministas (semilla fija): personajes, planetas, vehículos y usuarios
+con N favoritos cada uno repartidos entre los tres tipos. Si la base de datos
+ya tiene usuarios no hace nada.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 10000
+
+GENDERS = ('male', 'female', 'n/a', 'hermaphrodite')
+EYE_COLORS = ('blue', 'brown', 'yellow', 'red', 'black')
+CLIMATES = ('arid', 'temperate', 'frozen', 'murky', 'tropical')
+TERRAINS = ('desert', 'grasslands', 'mountains', 'jungle', 'ocean')
+VEHICLE_CLASSES = ('wheeled', 'repulsorcraft', 'starfighter', 'walker', 'airspeeder')
+
+
+def add_arguments(parser):
+    parser.add_argument('--characters', type=int, default=100000)
+    parser.add_argument('--planets', type=int, default=10000)
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--favorites-per-user', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def _number(rng, low, high, unknown=0.1):
+    if rng.random() < unknown:
+        return 'unknown'
+    return f"{rng.randint(low, high):,}"
+
+
+def character_row(rng, i):
+    return {'id': i, 'name': f'Character {i}', 'birth_year': f'{rng.randint(1, 900)}BBY',
+            'gender': rng.choice(GENDERS), 'height': _number(rng, 60, 260), 'skin_color': 'fair',
+            'eye_color': rng.choice(EYE_COLORS)}
+
+def planet_row(rng, i):
+    return {'id': i, 'name': f'Planet {i}', 'climate': rng.choice(CLIMATES), 'terrain': rng.choice(TERRAINS),
+            'diameter': _number(rng, 1000, 200000), 'population': _number(rng, 1000, 10 ** 12, unknown=0.3)}
+
+def vehicle_row(rng, i):
+    return {'id': i, 'name': f'Vehicle {i}', 'model': f'Model {i % 500}', 'manufacturer': f'Manufacturer {i % 50}',
+            'cost_in_credits': _number(rng, 1000, 10 ** 7, unknown=0.2), 'passengers': _number(rng, 0, 500),
+            'vehicle_class': rng.choice(VEHICLE_CLASSES)}
+
+
+def _insert(model, rows):
+    from sqlalchemy import insert
+    from src.models import db
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start:start + CHUNK]
+        if hasattr(model, 'numeric_values'):
+            chunk = [{**row, **model.numeric_values(row)} for row in chunk]
+        db.session.execute(insert(model.__table__), chunk)
+    db.session.commit()
+
+
+def seed(options):
+    """Siembra la base de DATABASE_URL; devuelve los volúmenes y el tiempo empleado."""
+    sys.path.insert(0, ROOT)
+    from flask_migrate import upgrade
+    from src.app import app
+    from src.models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
+    from src.favorites import reconcile_favorite_counts, FAVORITE_KINDS
+
+    volumes = {name: getattr(options, name) for name in
+               ('characters', 'planets', 'vehicles', 'users', 'favorites_per_user')}
+    start = time.perf_counter()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        if db.session.query(User.id).first() is not None:
+            return {'seeded': False, **volumes}
+
+        rng = random.Random(options.seed)
+        _insert(Character, [character_row(rng, i) for i in range(1, options.characters + 1)])
+        _insert(Planet, [planet_row(rng, i) for i in range(1, options.planets + 1)])
+        _insert(Vehicle, [vehicle_row(rng, i) for i in range(1, options.vehicles + 1)])
+        _insert(User, [{'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+                       for i in range(1, options.users + 1)])
+
+        # Favoritos repartidos por tipo: la mitad personajes, un cuarto planetas y un cuarto vehículos
+        per_kind = {
+            FavoriteCharacter: ('character_id', options.characters, options.favorites_per_user // 2),
+            FavoritePlanet: ('planet_id', options.planets, options.favorites_per_user // 4),
+            FavoriteVehicle: ('vehicle_id', options.vehicles, options.favorites_per_user - options.favorites_per_user // 2
+                              - options.favorites_per_user // 4),
+        }
+        for favorite_model, (column, population, count) in per_kind.items():
+            count = min(count, population)
+            _insert(favorite_model, [
+                {'user_id': user_id, column: target}
+                for user_id in range(1, options.users + 1)
+                for target in rng.sample(range(1, population + 1), count)
+            ])
+        for kind in FAVORITE_KINDS:
+            reconcile_favorite_counts(kind)
+        db.session.commit()
+
+        if db.engine.dialect.name == 'postgresql':
+            for table in ('character', 'planet', 'vehicle', 'user'):
+                db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                                           f"(SELECT MAX(id) FROM \"{table}\"))"))
+            db.session.commit()
+
+    return {'seeded': True, 'seconds': round(time.perf_counter() - start, 2), **volumes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    add_arguments(parser)
+    options = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = options.database_url
+    print(json.dumps(seed(options)))
+
+
+if __name__ == '__main__':
+    main()
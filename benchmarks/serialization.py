@@ -0,0 +1,83 @@
+"""Compara la ruta de serialización original de /people con la actual.
+
+    python -m benchmarks.serialization --rows 50000
+
+- legacy: Character.query.all() + serialize() por objeto ORM + json de la stdlib
+- fast:   tuplas de columnas (select) + el proveedor JSON de la app (orjson si está)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_serialize(person):
+    # Copia del serialize() escrito a mano que tenían los modelos
+    return {
+        'id': person.id,
+        'name': person.name,
+        'birth_year': person.birth_year,
+        'gender': person.gender,
+        'height': person.height,
+        'skin_color': person.skin_color,
+        'eye_color': person.eye_color,
+    }
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import insert, select
+    from src.app import app
+    from src.models import db, Character
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Character), [
+            {'name': f'Character {i}', 'birth_year': '19BBY', 'gender': 'n/a', 'height': str(i % 250),
+             'skin_color': 'gold', 'eye_color': 'yellow'}
+            for i in range(options.rows)
+        ])
+        db.session.commit()
+
+        def legacy():
+            db.session.expunge_all()
+            people = Character.query.all()
+            return len(json.dumps([legacy_serialize(person) for person in people]))
+
+        def fast():
+            # Tuplas de columnas en orden de PK, sin hidratar objetos ORM
+            fields = Character.serialize_fields
+            rows = db.session.execute(select(*[getattr(Character, name) for name in fields]).order_by(Character.id))
+            return len(app.json.dumps_bytes([dict(zip(fields, row)) for row in rows]))
+
+        results = {'rows': options.rows, 'json_provider': type(app.json).__name__}
+        for name, fn in (('legacy', legacy), ('fast', fast)):
+            seconds, size = best_of(fn, options.repeat)
+            results[name] = {'seconds': round(seconds, 4), 'rows_per_sec': int(options.rows / seconds), 'bytes': size}
+        results['speedup'] = round(results['legacy']['seconds'] / results['fast']['seconds'], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
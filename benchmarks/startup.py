@@ -0,0 +1,84 @@
+"""Mide el arranque de un worker en cada rol (APP_ROLE=full y api).
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --database-url postgresql://localhost/bench
+
+Cada medición es un proceso nuevo (como un worker de gunicorn recién creado):
+- import_ms: `import src.app` (módulos de la app y sus dependencias)
+- create_ms: `create_app()` (extensiones, rutas y, en full, Flask-Admin y Migrate)
+- first_request_ms: la primera petición a --path (conexión a la base de datos incluida)
+- modules: módulos cargados al terminar
+
+Se informa la mediana de --runs procesos por rol.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import src.app
+imported = time.perf_counter()
+app = src.app.create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_ms': (created - imported) * 1000,
+                  'first_request_ms': (done - created) * 1000, 'status': response.status_code,
+                  'modules': len(sys.modules)}))
+"""
+
+SETUP = """
+from src.app import create_app
+from src.models import db
+app = create_app()
+with app.app_context():
+    db.create_all()
+"""
+
+
+def measure(role, env, path, runs):
+    env = dict(env, APP_ROLE=role)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE, path], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    summary = {name: round(statistics.median(sample[name] for sample in samples), 1)
+               for name in ('import_ms', 'create_ms', 'first_request_ms')}
+    summary['total_ms'] = round(summary['import_ms'] + summary['create_ms'] + summary['first_request_ms'], 1)
+    summary['modules'] = samples[-1]['modules']
+    summary['status'] = samples[-1]['status']
+    return summary
+
+
+def startup_report(env, path='/people?limit=1', runs=5):
+    return {role: measure(role, env, path, runs) for role in ('full', 'api')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Defaults to an empty SQLite database with the schema created')
+    parser.add_argument('--path', default='/people?limit=1')
+    parser.add_argument('--runs', type=int, default=5)
+    options = parser.parse_args()
+
+    env = dict(os.environ, FLASK_DEBUG='0')
+    if options.database_url:
+        env['DATABASE_URL'] = options.database_url
+    else:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+        subprocess.run([sys.executable, '-c', SETUP], cwd=ROOT, env=env, check=True)
+
+    print(json.dumps(startup_report(env, options.path, options.runs), indent=2))
+
+
+if __name__ == '__main__':
+    main()
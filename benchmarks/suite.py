@@ -0,0 +1,341 @@
+"""Suite de benchmarks reproducible de la API, con salida JSON comparable entre commits.
+
+    python -m benchmarks.suite --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite --database-url postgresql://localhost/bench --characters 100000 --users 10000
+    python -m benchmarks.compare results/antes.json results/despues.json
+
+1. Siembra la base de datos (ver `benchmarks.seed`) en un subproceso, para no
+   inflar el pico de memoria medido aquí. Con --database-url se reutiliza una
+   base ya sembrada.
+2. Micro-benchmarks de las rutas de serialización (`serialize()`, tuplas de
+   columnas a dict, codificación JSON).
+3. Carga en proceso con el cliente de pruebas de Flask contra cada ruta de
+   `src/app.py` (las de escritura con preparación y limpieza sin medir).
+4. Carga HTTP contra un gunicorn real (`benchmarks.loadgen`).
+5. Arranque de un worker por rol (`benchmarks.startup`).
+
+Por ruta se informa p50/p95/p99, peticiones/s y errores; además el pico de
+RSS del proceso de la suite y del árbol de procesos de gunicorn.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from collections import namedtuple
+from .loadgen import run_load, wait_for_port, summarize
+from .seed import add_arguments as add_seed_arguments
+from .startup import startup_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# prepare() -> (ruta, cuerpo JSON o None, limpieza o None); sólo se mide la petición
+Scenario = namedtuple('Scenario', 'name method endpoint prepare')
+
+GUNICORN_PATHS = (
+    '/people?limit=100', '/people/1234', '/people?ids=1,20,300,4000,5,60,700,8000', '/planets?sort=-population&limit=50', '/vehicles?vehicle_class=walker',
+    '/search?q=char', '/popular/people', '/users/favorites', '/favorite/people', '/users/7',
+)
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_rss_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def process_tree_peak_rss_mb(pid):
+    """Suma de VmHWM del proceso y sus hijos (sólo Linux; None en otros sistemas)."""
+    def children(parent):
+        try:
+            with open(f'/proc/{parent}/task/{parent}/children') as handle:
+                return [int(child) for child in handle.read().split()]
+        except OSError:
+            return []
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as handle:
+                for line in handle:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            if current == pid:
+                return None
+        pending += children(current)
+    return round(total / 1024, 1)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def micro_benchmarks(app, rows, repeat):
+    from sqlalchemy import select
+    from src.models import db, User, Character
+
+    with app.app_context():
+        fields = Character.serialize_fields
+        people = Character.query.order_by(Character.id).limit(rows).all()
+        users = User.query.order_by(User.id).limit(rows).all()
+        tuples = db.session.execute(
+            select(*[getattr(Character, name) for name in fields]).order_by(Character.id).limit(rows)).all()
+        dicts = [person.serialize() for person in people]
+
+        def orm_load_and_serialize():
+            db.session.expunge_all()
+            return [person.serialize() for person in Character.query.order_by(Character.id).limit(rows)]
+
+        cases = {
+            'character_serialize': (len(people), lambda: [person.serialize() for person in people]),
+            'user_serialize': (len(users), lambda: [user.serialize() for user in users]),
+            'rows_to_dicts': (len(tuples), lambda: [dict(zip(fields, row)) for row in tuples]),
+            'json_encode': (len(dicts), lambda: app.json.dumps_bytes(dicts)),
+            'orm_load_and_serialize': (len(people), orm_load_and_serialize),
+        }
+        results = {}
+        for name, (count, fn) in cases.items():
+            seconds = best_of(fn, repeat)
+            results[name] = {'rows': count, 'seconds': round(seconds, 6),
+                             'rows_per_sec': int(count / seconds) if seconds else None}
+        return results
+
+
+def scenarios(app, volumes):
+    """Un escenario por ruta y método de `src/app.py` (algunas rutas con variantes de consulta)."""
+    from sqlalchemy import select
+    from src.models import db, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
+    from src.utils import get_current_user_id, insert_ignore_statement
+
+    user_id = get_current_user_id()
+    rng = random.Random(7)
+
+    def pick(volume):
+        return rng.randint(1, max(volumes[volume], 1))
+
+    def get(name, endpoint, path):
+        return Scenario(name, 'GET', endpoint, lambda: (path() if callable(path) else path, None, None))
+
+    def remove_batch(kind, target_id):
+        def cleanup():
+            app.test_client().delete('/users/favorites/batch', json={'favorites': [{'type': kind, 'id': target_id}]})
+        return cleanup
+
+    def post_favorite(path, kind, field, volume):
+        def prepare():
+            target_id = pick(volume)
+            return path, {field: target_id}, remove_batch(kind, target_id)
+        return prepare
+
+    def delete_favorite(path, kind, favorite_model, column, volume):
+        def prepare():
+            target_id = pick(volume)
+            with app.app_context():
+                db.session.execute(insert_ignore_statement(favorite_model, db.engine.dialect.name).values(
+                    {'user_id': user_id, column: target_id}))
+                favorite_id = db.session.scalar(select(favorite_model.id).where(
+                    favorite_model.user_id == user_id, getattr(favorite_model, column) == target_id))
+                db.session.commit()
+            return f'{path}/{favorite_id}', None, None
+        return prepare
+
+    def batch(method):
+        def prepare():
+            items = [{'type': 'character', 'id': pick('characters')} for _ in range(20)]
+            items += [{'type': 'planet', 'id': pick('planets')} for _ in range(10)]
+            body = {'favorites': items}
+            if method == 'POST':
+                return '/users/favorites/batch', body, lambda: app.test_client().delete(
+                    '/users/favorites/batch', json=body)
+            app.test_client().post('/users/favorites/batch', json=body)
+            return '/users/favorites/batch', body, None
+        return prepare
+
+    return [
+        get('sitemap', 'sitemap', '/'),
+        get('route_index', 'routes', '/routes'),
+        get('healthz', 'healthz', '/healthz'),
+        get('readyz', 'readyz', '/readyz'),
+        get('metrics', 'metrics', '/metrics'),
+        get('people_page', 'get_people', '/people?limit=100'),
+        get('people_deep_page', 'get_people', lambda: f'/people?limit=100&after={pick("characters") - 1}'),
+        get('people_sorted_filtered', 'get_people', '/people?sort=-height&height_gt=150&gender=female&limit=50'),
+        get('person', 'get_person', lambda: f'/people/{pick("characters")}'),
+        get('people_multiget', 'get_people',
+            lambda: '/people?ids=' + ','.join(str(pick('characters')) for _ in range(20))),
+        get('planets_page', 'get_planets', '/planets?limit=100'),
+        get('planets_by_population', 'get_planets', '/planets?sort=-population&climate=arid&limit=50'),
+        get('planet', 'get_planet', lambda: f'/planets/{pick("planets")}'),
+        get('vehicles_page', 'get_vehicles', '/vehicles?limit=100'),
+        get('vehicle', 'get_vehicle', lambda: f'/vehicles/{pick("vehicles")}'),
+        get('search', 'search', lambda: f'/search?q=character {rng.randint(1, 99)}'),
+        get('popular_people', 'get_popular_people', '/popular/people'),
+        get('popular_planets', 'get_popular_planets', '/popular/planets'),
+        get('popular_vehicles', 'get_popular_vehicles', '/popular/vehicles'),
+        get('users_page', 'get_users', '/users?limit=100'),
+        get('user', 'get_user', lambda: f'/users/{pick("users")}'),
+        get('favorite_planets', 'get_favorite_planets', '/favorite/planets'),
+        get('favorite_people', 'handle_favorite_character', '/favorite/people'),
+        get('user_favorites', 'get_user_favorites', '/users/favorites'),
+        Scenario('multiget_batch', 'POST', 'multiget', lambda: ('/batch', {'items': [
+            {'type': kind, 'id': pick(volume)} for kind, volume in
+            [('character', 'characters')] * 10 + [('planet', 'planets')] * 5 + [('vehicle', 'vehicles')] * 5]}, None)),
+        Scenario('add_favorite_character', 'POST', 'handle_favorite_character',
+                 post_favorite('/favorite/people', 'character', 'character_id', 'characters')),
+        Scenario('add_favorite_planet', 'POST', 'add_favorite_planet',
+                 post_favorite('/favorite/planet', 'planet', 'planet_id', 'planets')),
+        Scenario('add_favorite_vehicle', 'POST', 'add_favorite_vehicle',
+                 post_favorite('/favorite/vehicle', 'vehicle', 'vehicle_id', 'vehicles')),
+        Scenario('add_favorites_batch', 'POST', 'add_favorites_in_batch', batch('POST')),
+        Scenario('remove_favorites_batch', 'DELETE', 'remove_favorites_in_batch', batch('DELETE')),
+        Scenario('remove_favorite_character', 'DELETE', 'remove_favorite_character',
+                 delete_favorite('/favorite/people', 'character', FavoriteCharacter, 'character_id', 'characters')),
+        Scenario('remove_favorite_planet', 'DELETE', 'remove_favorite_planet',
+                 delete_favorite('/favorite/planet', 'planet', FavoritePlanet, 'planet_id', 'planets')),
+        Scenario('remove_favorite_vehicle', 'DELETE', 'remove_favorite_vehicle',
+                 delete_favorite('/favorite/vehicle', 'vehicle', FavoriteVehicle, 'vehicle_id', 'vehicles')),
+    ]
+
+def uncovered_routes(app, covered):
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.rule.startswith('/admin'):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            # Las rutas del API están en el blueprint `api`: api.get_people -> get_people
+            if (rule.endpoint.rpartition('.')[2], method) not in covered:
+                missing.append(f'{method} {rule.rule}')
+    return missing
+
+def in_process_load(app, volumes, requests_per_route, warmup):
+    client = app.test_client()
+    results = {}
+    plan = scenarios(app, volumes)
+    for scenario in plan:
+        latencies, errors, statuses = [], 0, {}
+        for iteration in range(warmup + requests_per_route):
+            path, body, cleanup = scenario.prepare()
+            start = time.perf_counter()
+            response = client.open(path, method=scenario.method, json=body)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            response.close()
+            if cleanup is not None:
+                cleanup()
+            if iteration < warmup:
+                continue
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            errors += response.status_code >= 500
+        summary = summarize(latencies, errors, sum(latencies))
+        summary['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+        results[scenario.name] = summary
+    covered = {(scenario.endpoint, scenario.method) for scenario in plan}
+    return results, uncovered_routes(app, covered)
+
+
+def gunicorn_load(env, options):
+    port = options.port
+    command = [sys.executable, '-m', 'gunicorn', 'src.wsgi:application', '-w', str(options.gunicorn_workers),
+               '-b', f'127.0.0.1:{port}', '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port('127.0.0.1', port):
+            raise RuntimeError("gunicorn did not start")
+        run_load('127.0.0.1', port, GUNICORN_PATHS, concurrency=min(4, options.concurrency), duration=2)  # calentamiento
+        results = run_load('127.0.0.1', port, GUNICORN_PATHS, concurrency=options.concurrency,
+                           duration=options.duration, per_path=True)
+        results['workers'] = options.gunicorn_workers
+        results['concurrency'] = options.concurrency
+        results['peak_rss_mb'] = process_tree_peak_rss_mb(process.pid)
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Reuse/seed this database instead of a temporary SQLite file')
+    add_seed_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route (in-process)')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--micro-rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-cache', action='store_true', help='Run with CACHE_ENABLED=0')
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    parser.add_argument('--gunicorn-workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8781)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    options = parser.parse_args()
+
+    database_url = options.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_DEBUG='0')
+    if options.no_cache:
+        env['CACHE_ENABLED'] = '0'
+
+    seed_command = [sys.executable, '-m', 'benchmarks.seed', '--database-url', database_url]
+    for name in ('characters', 'planets', 'vehicles', 'users', 'favorites_per_user', 'seed'):
+        seed_command += ['--' + name.replace('_', '-'), str(getattr(options, name))]
+    seeded = json.loads(subprocess.run(seed_command, cwd=ROOT, env=env, capture_output=True, text=True,
+                                       check=True).stdout.strip().splitlines()[-1])
+
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    import sqlalchemy
+    from src.app import app
+
+    volumes = {name: getattr(options, name) for name in ('characters', 'planets', 'vehicles', 'users')}
+    report = {
+        'meta': {
+            'commit': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'platform': platform.platform(),
+            'database': sqlalchemy.engine.make_url(database_url).get_backend_name(),
+            'json_provider': type(app.json).__name__,
+            'cache_enabled': bool(app.config.get('CACHE_ENABLED')),
+            'seed': seeded,
+        },
+        'micro': micro_benchmarks(app, options.micro_rows, options.repeat),
+    }
+    report['in_process'], report['uncovered_routes'] = in_process_load(app, volumes, options.requests, options.warmup)
+    report['in_process_peak_rss_mb'] = peak_rss_mb()
+    report['startup'] = startup_report(env, runs=options.repeat)
+    if not options.skip_gunicorn:
+        report['gunicorn'] = gunicorn_load(env, options)
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+        with open(options.output, 'w') as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -51,6 +51,17 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Índice de búsqueda creado con SQL propio (3710ba2138ce), fuera de los modelos:
+    # la tabla FTS5 catalog_search y sus tablas internas en SQLite y los índices
+    # GIN ix_<tabla>_search en Postgres. Sin esto autogenerate propondría borrarlos.
+    if type_ == 'table' and name.startswith('catalog_search'):
+        return False
+    if type_ == 'index' and name and name.startswith('ix_') and name.endswith('_search'):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +105,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
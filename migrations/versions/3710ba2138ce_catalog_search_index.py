@@ -0,0 +1,72 @@
+"""Full-text search index over characters, planets and vehicles
+
+Revision ID: 3710ba2138ce
+Revises: ae437cb8901d
+Create Date: 2026-10-18 12:20:05.447310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3710ba2138ce'
+down_revision = 'ae437cb8901d'
+branch_labels = None
+depends_on = None
+
+
+# Postgres: índices GIN sobre expresiones tsvector (deben coincidir con src/search.py)
+PG_VECTORS = {
+    'character': "to_tsvector('simple', coalesce(name, ''))",
+    'planet': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+              "setweight(to_tsvector('simple', coalesce(terrain, '') || ' ' || coalesce(climate, '')), 'B')",
+    'vehicle': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+               "setweight(to_tsvector('simple', coalesce(model, '') || ' ' || coalesce(manufacturer, '')), 'B')",
+}
+
+# SQLite: tabla FTS5 con rowid = id * 4 + tipo, mantenida por triggers
+SQLITE_KINDS = {
+    'character': (1, "coalesce(new.name, '')", "''"),
+    'planet': (2, "coalesce(new.name, '')", "coalesce(new.terrain, '') || ' ' || coalesce(new.climate, '')"),
+    'vehicle': (3, "coalesce(new.name, '')", "coalesce(new.model, '') || ' ' || coalesce(new.manufacturer, '')"),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, vector in PG_VECTORS.items():
+            op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (({vector}))")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE catalog_search USING fts5("
+                   "name, details, prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+        for table, (code, name, details) in SQLITE_KINDS.items():
+            rowid = f"new.id * 4 + {code}"
+            insert = f"INSERT INTO catalog_search (rowid, name, details) VALUES ({rowid}, {name}, {details});"
+            op.execute(f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+            op.execute(f"CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} BEGIN "
+                       f"DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; {insert} END")
+            op.execute(f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN "
+                       f"DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; END")
+            op.execute(f"INSERT INTO catalog_search (rowid, name, details) "
+                       f"SELECT {rowid}, {name}, {details} FROM {table} AS new")
+    else:
+        # Otros motores usan búsqueda por prefijo (LIKE 'q%') sobre el nombre
+        for table in PG_VECTORS:
+            op.create_index(f'ix_{table}_name', table, ['name'], unique=False)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in PG_VECTORS:
+            op.execute(f"DROP INDEX ix_{table}_search")
+    elif dialect == 'sqlite':
+        for table in SQLITE_KINDS:
+            for suffix in ('ai', 'au', 'ad'):
+                op.execute(f"DROP TRIGGER {table}_search_{suffix}")
+        op.execute("DROP TABLE catalog_search")
+    else:
+        for table in PG_VECTORS:
+            op.drop_index(f'ix_{table}_name', table_name=table)
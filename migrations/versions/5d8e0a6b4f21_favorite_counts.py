@@ -0,0 +1,42 @@
+"""Favorite counters per catalog entity
+
+Revision ID: 5d8e0a6b4f21
+Revises: 9b1f4e7c2d30
+Create Date: 2026-10-18 14:02:17.603518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e0a6b4f21'
+down_revision = '9b1f4e7c2d30'
+branch_labels = None
+depends_on = None
+
+
+FAVORITE_TABLES = (
+    ('character', 'favorite_character', 'character_id'),
+    ('planet', 'favorite_planet', 'planet_id'),
+    ('vehicle', 'favorite_vehicle', 'vehicle_id'),
+)
+
+
+def upgrade():
+    op.create_table('favorite_count',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'entity_id')
+    )
+    # Carga inicial desde los favoritos existentes
+    for kind, table, target in FAVORITE_TABLES:
+        op.execute(f"INSERT INTO favorite_count (kind, entity_id, count) "
+                   f"SELECT '{kind}', {target}, COUNT(*) FROM {table} GROUP BY {target}")
+    op.create_index('ix_favorite_count_kind_count_entity_id', 'favorite_count', ['kind', 'count', 'entity_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_favorite_count_kind_count_entity_id', table_name='favorite_count')
+    op.drop_table('favorite_count')
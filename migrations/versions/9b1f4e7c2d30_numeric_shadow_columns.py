@@ -0,0 +1,96 @@
+"""Numeric shadow columns and filter/sort indexes on the catalog
+
+Revision ID: 9b1f4e7c2d30
+Revises: 3710ba2138ce
+Create Date: 2026-10-18 13:05:52.281904
+
+"""
+import math
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f4e7c2d30'
+down_revision = '3710ba2138ce'
+branch_labels = None
+depends_on = None
+
+
+# tabla -> [(columna de texto, columna numérica, tipo)]
+NUMERIC_COLUMNS = {
+    'character': [('height', 'height_num', sa.Float())],
+    'planet': [('diameter', 'diameter_num', sa.BigInteger()),
+               ('population', 'population_num', sa.BigInteger())],
+    'vehicle': [('cost_in_credits', 'cost_in_credits_num', sa.BigInteger()),
+                ('passengers', 'passengers_num', sa.BigInteger())],
+}
+EQUALITY_INDEXES = {
+    'character': ['gender', 'eye_color'],
+    'planet': ['climate', 'terrain'],
+    'vehicle': ['vehicle_class', 'manufacturer'],
+}
+BACKFILL_BATCH = 5000
+
+
+def parse_number(value, integer):
+    # Copia de models.parse_number: la migración no depende del código de la app
+    if value is None:
+        return None
+    try:
+        number = float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+    if not math.isfinite(number):
+        return None
+    if integer:
+        return round(number)
+    return int(number) if number.is_integer() else number
+
+
+def backfill(table, columns):
+    conn = op.get_bind()
+    # 'character' es palabra reservada en MySQL
+    table = conn.dialect.identifier_preparer.quote(table)
+    raw = ", ".join(source for source, _, _ in columns)
+    assignments = ", ".join(f"{target} = :{target}" for _, target, _ in columns)
+    update = sa.text(f"UPDATE {table} SET {assignments} WHERE id = :id")
+
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(f"SELECT id, {raw} FROM {table} WHERE id > :after ORDER BY id LIMIT :limit"),
+                            {'after': last_id, 'limit': BACKFILL_BATCH}).all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            values = {'id': row[0]}
+            for (_, target, type_), value in zip(columns, row[1:]):
+                values[target] = parse_number(value, isinstance(type_, sa.Integer))
+            params.append(values)
+        conn.execute(update, params)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    # add_column/create_index sin batch: en SQLite no se recrea la tabla (conserva los triggers de búsqueda)
+    for table, columns in NUMERIC_COLUMNS.items():
+        for _, target, type_ in columns:
+            op.add_column(table, sa.Column(target, type_, nullable=True))
+        backfill(table, columns)
+        for _, target, _ in columns:
+            op.create_index(f'ix_{table}_{target}_id', table, [target, 'id'], unique=False)
+        op.create_index(f'ix_{table}_name_id', table, ['name', 'id'], unique=False)
+        for column in EQUALITY_INDEXES[table]:
+            op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+
+def downgrade():
+    for table, columns in NUMERIC_COLUMNS.items():
+        for column in EQUALITY_INDEXES[table]:
+            op.drop_index(f'ix_{table}_{column}', table_name=table)
+        op.drop_index(f'ix_{table}_name_id', table_name=table)
+        for _, target, _ in columns:
+            op.drop_index(f'ix_{table}_{target}_id', table_name=table)
+        for _, target, _ in columns:
+            op.drop_column(table, target)
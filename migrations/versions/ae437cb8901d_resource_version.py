@@ -0,0 +1,29 @@
+"""Resource version table for conditional GETs
+
+Revision ID: ae437cb8901d
+Revises: c3060f85a95a
+Create Date: 2026-10-18 11:02:17.530981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae437cb8901d'
+down_revision = 'c3060f85a95a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resource_version',
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('resource_version')
@@ -0,0 +1,43 @@
+"""Unique and lookup indexes on favorite tables
+
+Revision ID: c3060f85a95a
+Revises: 76079ccf897c
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3060f85a95a'
+down_revision = '76079ccf897c'
+branch_labels = None
+depends_on = None
+
+
+FAVORITE_TABLES = (
+    ('favorite_character', 'character_id'),
+    ('favorite_planet', 'planet_id'),
+    ('favorite_vehicle', 'vehicle_id'),
+)
+
+
+def upgrade():
+    for table, target in FAVORITE_TABLES:
+        # Borrar duplicados existentes antes de crear el índice único
+        # (la tabla derivada es necesaria para MySQL)
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN ("
+            f"SELECT id FROM (SELECT MIN(id) AS id FROM {table} GROUP BY user_id, {target}) AS keep)"
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{table}_user_id_{target}', ['user_id', target], unique=True)
+            batch_op.create_index(f'ix_{table}_{target}', [target], unique=False)
+
+
+def downgrade():
+    for table, target in reversed(FAVORITE_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_{target}')
+            batch_op.drop_index(f'ix_{table}_user_id_{target}')
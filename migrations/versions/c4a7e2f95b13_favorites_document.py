@@ -0,0 +1,32 @@
+"""Per-user favorites document
+
+Revision ID: c4a7e2f95b13
+Revises: 5d8e0a6b4f21
+Create Date: 2026-10-18 16:21:44.918207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2f95b13'
+down_revision = '5d8e0a6b4f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Vacía: los documentos se generan en la primera lectura o con `flask favorites rebuild`
+    op.create_table('favorites_document',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('document', sa.Text().with_variant(sa.Text(length=16777215), 'mysql', 'mariadb'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('favorites_document')
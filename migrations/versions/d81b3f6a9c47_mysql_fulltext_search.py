@@ -0,0 +1,46 @@
+"""Full-text search index on MySQL/MariaDB
+
+Revision ID: d81b3f6a9c47
+Revises: c4a7e2f95b13
+Create Date: 2026-10-18 17:12:38.204561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81b3f6a9c47'
+down_revision = 'c4a7e2f95b13'
+branch_labels = None
+depends_on = None
+
+
+# Mismos campos que los índices de Postgres y SQLite (deben coincidir con src/search.py)
+SEARCH_FIELDS = {
+    'character': ('name',),
+    'planet': ('name', 'terrain', 'climate'),
+    'vehicle': ('name', 'model', 'manufacturer'),
+}
+
+
+def upgrade():
+    # Sustituye los índices b-tree de 3710ba2138ce, que el LIKE sobre lower(name) no usaba
+    if op.get_bind().dialect.name not in ('mysql', 'mariadb'):
+        return
+    for table, fields in SEARCH_FIELDS.items():
+        op.drop_index(f'ix_{table}_name', table_name=table)
+        # El índice de sólo el nombre pondera su relevancia (como el peso 'A' en Postgres)
+        op.create_index(f'ix_{table}_name_search', table, ['name'], mysql_prefix='FULLTEXT')
+        if len(fields) > 1:
+            op.create_index(f'ix_{table}_search', table, list(fields), mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name not in ('mysql', 'mariadb'):
+        return
+    for table, fields in SEARCH_FIELDS.items():
+        if len(fields) > 1:
+            op.drop_index(f'ix_{table}_search', table_name=table)
+        op.drop_index(f'ix_{table}_name_search', table_name=table)
+        op.create_index(f'ix_{table}_name', table, ['name'], unique=False)
@@ -8,4 +8,5 @@ set -o errexit
 
 pipenv install
 
-pipenv run upgrade
\ No newline at end of file
+# Las migraciones necesitan el rol full aunque el servicio web use APP_ROLE=api
+APP_ROLE=full pipenv run upgrade
\ No newline at end of file
@@ -3,12 +3,18 @@ from flask_admin import Admin
 from .models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoriteVehicle, FavoritePlanet
 from flask_admin.contrib.sqla import ModelView
 
+class CatalogView(ModelView):
+    # Las columnas *_num se calculan al guardar a partir del texto
+    def __init__(self, model, session, **kwargs):
+        self.form_excluded_columns = list(model.numeric_fields.values())
+        super().__init__(model, session, **kwargs)
+
 def setup_admin(app):
     admin = Admin(app, name='Admin', template_mode='bootstrap3')
     admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Character, db.session))
-    admin.add_view(ModelView(Planet, db.session))
-    admin.add_view(ModelView(Vehicle, db.session))
+    admin.add_view(CatalogView(Character, db.session))
+    admin.add_view(CatalogView(Planet, db.session))
+    admin.add_view(CatalogView(Vehicle, db.session))
     admin.add_view(ModelView(FavoriteCharacter, db.session))
     admin.add_view(ModelView(FavoritePlanet, db.session))
     admin.add_view(ModelView(FavoriteVehicle, db.session))
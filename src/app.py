@@ -1,95 +1,226 @@
+"""Aplicación Flask: `create_app(config, role)` construye una instancia nueva.
+
+Roles de proceso (APP_ROLE):
+- full (por defecto): API, Flask-Admin en /admin, Flask-Migrate y los
+  comandos `flask ingest` / `flask favorites`. Es el que usan `flask run`,
+  `flask db upgrade` y los cron.
+- api: sólo las rutas del API. No importa Flask-Admin, Alembic ni requests,
+  así que los workers arrancan antes (gunicorn src.wsgi:application con
+  APP_ROLE=api). Las mediciones están en benchmarks/startup.py.
+
+`from src.app import app` sigue funcionando: la instancia del módulo se crea
+la primera vez que se pide, no al importar.
+"""
 import os
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask import Flask, Blueprint, request, jsonify, current_app
 from flask_cors import CORS
-from .utils import APIException, generate_sitemap
-from .admin import setup_admin
-from .models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
-from dotenv import load_dotenv
-load_dotenv()
+from .utils import APIException, sitemap_response, get_current_user_id
+from .health import readiness
+from .pagination import paginated_response
+from .json_provider import init_json
+from .pool import engine_options, init_pool
+from .routing import init_replicas
+from .metrics import metrics_response
+from .instrumentation import init_instrumentation
+from .compression import init_compression
+from .ratelimit import init_rate_limits, route_class
+from .cache import init_cache, get_entity_json, json_response
+from .versions import conditional, favorites_version_keys, CATALOG_KEYS
+from .search import parse_search_args, search_catalog
+from .multiget import multiget_response, multiget_json, parse_multiget
+from .favorites import favorites_json, user_favorites_json, add_favorite, remove_favorite, parse_batch, add_favorites_batch, remove_favorites_batch
+from .favorites import favorites_cli, popular, parse_popular_limit
+from .models import db, User, Character, Planet, Vehicle
+
+ROLES = ('full', 'api')
+
+api = Blueprint('api', __name__)
+
+
+def create_app(config=None, role=None):
+    """Crea la app; `config` sobrescribe la configuración leída del entorno."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    app.secret_key = os.urandom(24)
+    app.config.update(config or {})
+    role = role or app.config.get('APP_ROLE') or os.getenv('APP_ROLE', 'full')
+    if role not in ROLES:
+        raise ValueError(f"Unknown APP_ROLE {role!r}; expected one of {', '.join(ROLES)}")
+    app.config['APP_ROLE'] = role
+    init_json(app)
+
+    # Setup database
+    db_url = os.getenv("DATABASE_URL")
+    if db_url:
+        app.config.setdefault('SQLALCHEMY_DATABASE_URI', db_url.replace("postgres://", "postgresql://"))
+    else:
+        app.config.setdefault('SQLALCHEMY_DATABASE_URI', "sqlite:////tmp/test.db")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    init_pool(app, db)
+    # Réplicas de lectura opcionales: DATABASE_REPLICA_URLS=url1,url2
+    init_replicas(app, db)
+    init_cache(app)
+    # Métricas por endpoint, Server-Timing y perfiles muestreados: INSTRUMENTATION_ENABLED=1
+    init_instrumentation(app)
+    # Límites por cliente y topes de concurrencia por clase de ruta: RATELIMIT_ENABLED=1
+    init_rate_limits(app)
+    # Después de la instrumentación: sus after_request corren antes y se mide el cuerpo comprimido
+    init_compression(app)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    app.register_blueprint(api)
+
+    if role == 'full':
+        # Importaciones diferidas: Flask-Admin, Alembic y requests sólo en este rol
+        from flask_migrate import Migrate
+        from .admin import setup_admin
+        from .ingest import ingest_command
+        Migrate(app, db)
+        setup_admin(app)
+        app.cli.add_command(ingest_command)
+        app.cli.add_command(favorites_cli)
+
+    return app
+
+
+def __getattr__(name):
+    # `app` del módulo (FLASK_APP=src/app.py, scripts y benchmarks): se crea al pedirla
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-app.secret_key = os.urandom(24)
-
-# Setup database
-db_url = os.getenv("DATABASE_URL")
-if db_url:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-setup_admin(app)
-
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     response = jsonify(error.to_dict())
     response.status_code = error.status_code
     return response
 
-# generate sitemap with all your endpoints
-@app.route('/')
+# generate sitemap with all your endpoints (se genera una vez y se sirve ya hecho)
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return sitemap_response(current_app, 'html')
+
+# Índice de rutas en JSON: métodos y parámetros de cada ruta
+@api.route('/routes', methods=['GET'])
+def routes():
+    return sitemap_response(current_app, 'json')
+
+# Sondas de liveness y readiness (pool de conexiones de cada engine)
+@api.route('/healthz', methods=['GET'])
+@route_class(None)
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@api.route('/readyz', methods=['GET'])
+@route_class(None)
+def readyz():
+    ready, checks = readiness()
+    return jsonify({"status": "ready" if ready else "unavailable", "engines": checks}), 200 if ready else 503
+
+# Métricas en formato Prometheus (pool de conexiones, caché...)
+@api.route('/metrics', methods=['GET'])
+@route_class(None)
+def metrics():
+    return metrics_response()
 
 # Endpoints de Characters
-@app.route('/people', methods=['GET'])
+@api.route('/people', methods=['GET'])
+@route_class('list')
+@conditional(('character',))
 def get_people():
-    people = Character.query.all()
-    result = [person.serialize() for person in people]
-    return jsonify(result), 200
+    if 'ids' in request.args:
+        return multiget_response('character', request.args['ids'])
+    return paginated_response(Character)
 
-@app.route('/people/<int:people_id>', methods=['GET'])
+@api.route('/people/<int:people_id>', methods=['GET'])
+@conditional(('character',))
 def get_person(people_id):
-    person = Character.query.get(people_id)
-    if not person:
+    body = get_entity_json(Character, people_id)
+    if body is None:
         return jsonify({"msg": "Character not found"}), 404
-    return jsonify(person.serialize()), 200
+    return json_response(body)
 
 # Endpoints de Planets
-@app.route('/planets', methods=['GET'])
+@api.route('/planets', methods=['GET'])
+@route_class('list')
+@conditional(('planet',))
 def get_planets():
-    planets = Planet.query.all()
-    result = [planet.serialize() for planet in planets]
-    return jsonify(result), 200
+    if 'ids' in request.args:
+        return multiget_response('planet', request.args['ids'])
+    return paginated_response(Planet)
 
-@app.route('/planets/<int:planet_id>', methods=['GET'])
+@api.route('/planets/<int:planet_id>', methods=['GET'])
+@conditional(('planet',))
 def get_planet(planet_id):
-    planet = Planet.query.get(planet_id)
-    if not planet:
+    body = get_entity_json(Planet, planet_id)
+    if body is None:
         return jsonify({"msg": "Planet not found"}), 404
-    return jsonify(planet.serialize()), 200
+    return json_response(body)
 
 # Endpoints de Vehicles
-@app.route('/vehicles', methods=['GET'])
+@api.route('/vehicles', methods=['GET'])
+@route_class('list')
+@conditional(('vehicle',))
 def get_vehicles():
-    vehicles = Vehicle.query.all()
-    result = [vehicle.serialize() for vehicle in vehicles]
-    return jsonify(result), 200
+    if 'ids' in request.args:
+        return multiget_response('vehicle', request.args['ids'])
+    return paginated_response(Vehicle)
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@api.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@conditional(('vehicle',))
 def get_vehicle(vehicle_id):
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not vehicle:
+    body = get_entity_json(Vehicle, vehicle_id)
+    if body is None:
         return jsonify({"msg": "Vehicle not found"}), 404
-    return jsonify(vehicle.serialize()), 200
+    return json_response(body)
+
+# Endpoint de búsqueda en el catálogo (personajes, planetas y vehículos)
+@api.route('/search', methods=['GET'])
+@route_class('list')
+@conditional(CATALOG_KEYS)
+def search():
+    tokens, kinds, limit = parse_search_args(request.args)
+    results = search_catalog(db.session.connection(), tokens, kinds, limit)
+    return jsonify({"query": " ".join(tokens), "results": results}), 200
+
+# Multi-get: entidades de varios tipos por id en una sola petición
+@api.route('/batch', methods=['POST'])
+@route_class('list')
+def multiget():
+    return json_response(multiget_json(parse_multiget(request.get_json(silent=True))))
+
+# Ranking de los más marcados como favoritos (contadores en favorite_count)
+@api.route('/popular/people', methods=['GET'])
+def get_popular_people():
+    return jsonify(popular('character', parse_popular_limit(request.args))), 200
+
+@api.route('/popular/planets', methods=['GET'])
+def get_popular_planets():
+    return jsonify(popular('planet', parse_popular_limit(request.args))), 200
+
+@api.route('/popular/vehicles', methods=['GET'])
+def get_popular_vehicles():
+    return jsonify(popular('vehicle', parse_popular_limit(request.args))), 200
 
 # Endpoints de Users
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@route_class('list')
+@conditional(('user',))
 def get_users():
-    users = User.query.all()
-    result = [user.serialize() for user in users]
-    return jsonify(result), 200
+    return paginated_response(User)
 
-@app.route('/users/<int:user_id>', methods=['GET'])
+@api.route('/users/<int:user_id>', methods=['GET'])
+@conditional(('user',))
 def get_user(user_id):
     user = User.query.get(user_id)
     if not user:
@@ -97,133 +228,126 @@ def get_user(user_id):
     return jsonify(user.serialize()), 200
 
 # Endpoints de Favoritos de Planets
-@app.route('/favorite/planets', methods=['GET'])
+@api.route('/favorite/planets', methods=['GET'])
+@conditional(lambda: favorites_version_keys(get_current_user_id()))
 def get_favorite_planets():
-    current_user_id = 1  # Aquí debes reemplazar con la lógica de autenticación real
-    user = User.query.get(current_user_id)
-    if not user:
+    current_user_id = get_current_user_id()
+    if db.session.get(User, current_user_id) is None:
         return jsonify({"msg": "User not found"}), 404
-    
-    favorite_planets = [fav.planet.serialize() for fav in user.favorite_planets]
-    return jsonify(favorite_planets), 200
+
+    return json_response(favorites_json('planet', current_user_id))
 
 # Endpoints de Favoritos de Characters
-@app.route('/favorite/people', methods=['GET', 'POST'])
+@api.route('/favorite/people', methods=['GET', 'POST'])
+@conditional(lambda: favorites_version_keys(get_current_user_id()))
 def handle_favorite_character():
     if request.method == 'POST':
         data = request.get_json()
-        current_user_id = 1  # Reemplaza con la lógica de autenticación real
+        current_user_id = get_current_user_id()
         
         character_id = data.get('character_id')
         if not character_id:
             return jsonify({"msg": "Character ID is required"}), 400
 
-        favorite = FavoriteCharacter(user_id=current_user_id, character_id=character_id)
-        db.session.add(favorite)
+        if not add_favorite('character', current_user_id, character_id):
+            return jsonify({"error": "El usuario ya tiene este personaje como favorito"}), 409
         db.session.commit()
 
         return jsonify({"msg": "Favorite character added"}), 201
 
     elif request.method == 'GET':
-        current_user_id = 1  # Reemplaza con la lógica de autenticación real
-        user = User.query.get(current_user_id)
-        if not user:
+        current_user_id = get_current_user_id()
+        if db.session.get(User, current_user_id) is None:
             return jsonify({"msg": "User not found"}), 404
-        
-        favorite_characters = [fav.character.serialize() for fav in user.favorite_characters]
-        return jsonify(favorite_characters), 200
+
+        return json_response(favorites_json('character', current_user_id))
 
 # Endpoint para obtener todos los favoritos de un usuario
-@app.route('/users/favorites', methods=['GET'])
+@api.route('/users/favorites', methods=['GET'])
+@conditional(lambda: favorites_version_keys(get_current_user_id()))
 def get_user_favorites():
-    current_user_id = 1  # Esto debe ser reemplazado por la lógica de autenticación real
-    user = User.query.get(current_user_id)
-    if not user:
+    current_user_id = get_current_user_id()
+    if db.session.get(User, current_user_id) is None:
         return jsonify({"msg": "User not found"}), 404
-    
-    favorite_characters = [fav.character.serialize() for fav in user.favorite_characters]
-    favorite_planets = [fav.planet.serialize() for fav in user.favorite_planets]
-    favorite_vehicles = [fav.vehicle.serialize() for fav in user.favorite_vehicles]
 
-    return jsonify({
-        "favorite_characters": favorite_characters,
-        "favorite_planets": favorite_planets,
-        "favorite_vehicles": favorite_vehicles
-    }), 200
+    return json_response(user_favorites_json(current_user_id))
+
+# Endpoints para añadir/eliminar muchos favoritos en una sola transacción
+@api.route('/users/favorites/batch', methods=['POST'])
+def add_favorites_in_batch():
+    current_user_id = get_current_user_id()
+    results = add_favorites_batch(current_user_id, parse_batch(request.get_json(silent=True)))
+    db.session.commit()
+
+    return jsonify({"results": results}), 200
+
+@api.route('/users/favorites/batch', methods=['DELETE'])
+def remove_favorites_in_batch():
+    current_user_id = get_current_user_id()
+    results = remove_favorites_batch(current_user_id, parse_batch(request.get_json(silent=True)))
+    db.session.commit()
+
+    return jsonify({"results": results}), 200
 
 # Endpoint para añadir un planeta favorito
-@app.route('/favorite/planet', methods=['POST'])
+@api.route('/favorite/planet', methods=['POST'])
 def add_favorite_planet():
     data = request.get_json()
-    current_user_id = 1  # Esto debe ser reemplazado por la lógica de autenticación real
+    current_user_id = get_current_user_id()
     
     planet_id = data.get('planet_id')
     if not planet_id:
         return jsonify({"msg": "Planet ID is required"}), 400
 
-    # Verificar si ya existe un registro con el mismo user_id y planet_id
-    existing_favorite = FavoritePlanet.query.filter_by(user_id=current_user_id, planet_id=planet_id).first()
-
-    if existing_favorite:
+    # Inserción atómica: el índice único (user_id, planet_id) detecta el duplicado
+    if not add_favorite('planet', current_user_id, planet_id):
         return jsonify({"error": "El usuario ya tiene este planeta como favorito"}), 409
-
-    favorite = FavoritePlanet(user_id=current_user_id, planet_id=planet_id)
-    db.session.add(favorite)
     db.session.commit()
 
     return jsonify({"msg": "Favorite planet added"}), 201
 
 # Endpoint para añadir un vehículo favorito
-@app.route('/favorite/vehicle', methods=['POST'])
+@api.route('/favorite/vehicle', methods=['POST'])
 def add_favorite_vehicle():
     data = request.get_json()
-    current_user_id = 1  # Esto debe ser reemplazado por la lógica de autenticación real
+    current_user_id = get_current_user_id()
     
     vehicle_id = data.get('vehicle_id')
     if not vehicle_id:
         return jsonify({"msg": "Vehicle ID is required"}), 400
 
-    favorite = FavoriteVehicle(user_id=current_user_id, vehicle_id=vehicle_id)
-    db.session.add(favorite)
+    if not add_favorite('vehicle', current_user_id, vehicle_id):
+        return jsonify({"error": "El usuario ya tiene este vehículo como favorito"}), 409
     db.session.commit()
 
     return jsonify({"msg": "Favorite vehicle added"}), 201
 
 # Endpoints para eliminar favoritos
-@app.route('/favorite/people/<int:favorite_id>', methods=['DELETE'])
+@api.route('/favorite/people/<int:favorite_id>', methods=['DELETE'])
 def remove_favorite_character(favorite_id):
-    favorite = FavoriteCharacter.query.get(favorite_id)
-    if not favorite:
+    if not remove_favorite('character', favorite_id):
         return jsonify({"msg": "Favorite character not found"}), 404
-
-    db.session.delete(favorite)
     db.session.commit()
 
     return jsonify({"msg": "Favorite character removed"}), 200
 
-@app.route('/favorite/planet/<int:favorite_id>', methods=['DELETE'])
+@api.route('/favorite/planet/<int:favorite_id>', methods=['DELETE'])
 def remove_favorite_planet(favorite_id):
-    favorite = FavoritePlanet.query.get(favorite_id)
-    if not favorite:
+    if not remove_favorite('planet', favorite_id):
         return jsonify({"msg": "Favorite planet not found"}), 404
-
-    db.session.delete(favorite)
     db.session.commit()
 
     return jsonify({"msg": "Favorite planet removed"}), 200
 
-@app.route('/favorite/vehicle/<int:favorite_id>', methods=['DELETE'])
+@api.route('/favorite/vehicle/<int:favorite_id>', methods=['DELETE'])
 def remove_favorite_vehicle(favorite_id):
-    favorite = FavoriteVehicle.query.get(favorite_id)
-    if not favorite:
+    if not remove_favorite('vehicle', favorite_id):
         return jsonify({"msg": "Favorite vehicle not found"}), 404
-
-    db.session.delete(favorite)
     db.session.commit()
 
     return jsonify({"msg": "Favorite vehicle removed"}), 200
 
 # This only runs if `$ python src/main.py` is executed
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
 
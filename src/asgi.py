@@ -0,0 +1,444 @@
+"""Modo ASGI: las mismas rutas de lectura y de favoritos sobre asyncio.
+
+    uvicorn src.asgi:application --workers 2
+    gunicorn src.asgi:application -k uvicorn.workers.UvicornWorker
+
+Usa un engine asíncrono de SQLAlchemy (asyncpg para Postgres, aiosqlite para
+SQLite) y reutiliza las mismas sentencias que la app Flask (`pagination.py`,
+`favorites.py`, `multiget.py`, `search.py`) y la misma codificación JSON, así
+que los cuerpos son idénticos: listados con filtros, cursores, ?ids= y
+?stream=1 (o NDJSON), /search, /batch y las altas y bajas de favoritos,
+sueltas o por lotes. La app WSGI (`wsgi.py`) sigue funcionando igual y es la
+única con Flask-Admin, /, /routes, /metrics, /healthz y /readyz, los límites
+de peticiones, la caché de respuestas (aquí sólo se invalida), ETag/304 y la
+compresión.
+
+Dependencias adicionales: uvicorn, greenlet y asyncpg o aiosqlite.
+"""
+import os
+import re
+import json
+import asyncio
+import logging
+from urllib.parse import parse_qsl, urlencode
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from dotenv import load_dotenv
+from .models import User, Character, Planet, Vehicle
+from .utils import APIException, get_current_user_id
+from .pagination import parse_list_args, fetch_list_rows, encode_cursor, list_statements
+from .pagination import ndjson_chunk, json_array_chunk, NDJSON_MIMETYPE, STREAM_BATCH_SIZE
+from .favorites import FAVORITE_KINDS, favorites_statement, favorites_document, popular_statement, parse_popular_limit
+from .favorites import insert_favorite, delete_favorite, parse_batch, insert_favorites, delete_favorites
+from .versions import favorites_version_key
+from .pool import env_int, env_bool
+from .cache import ResponseCache, encode_json
+from .cache_backends import create_backend
+from .multiget import ENTITY_KINDS, parse_ids, parse_multiget, multiget_ids, multiget_body
+from .search import parse_search_args, search_catalog
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def async_database_url():
+    url = os.getenv("DATABASE_ASYNC_URL") or os.getenv("DATABASE_URL") or "sqlite:////tmp/test.db"
+    url = url.replace("postgres://", "postgresql://")
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def async_engine_options(url):
+    if url.startswith("sqlite") and ':memory:' in url:
+        return {}
+    return {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path'].rstrip('/') or '/'
+        self.args = dict(parse_qsl(scope.get('query_string', b'').decode()))
+        self.headers = {name.decode().lower(): value.decode() for name, value in scope.get('headers', [])}
+        self.accept = parse_accept_header(self.headers.get('accept'), MIMEAccept)
+        self.body = body
+
+    def wants_stream(self):
+        # Como pagination.wants_stream
+        return self.args.get('stream') in ('1', 'true') or self.accept.best == NDJSON_MIMETYPE
+
+    def wants_ndjson(self):
+        return self.accept.best == NDJSON_MIMETYPE or self.args.get('format') == 'ndjson'
+
+    def json(self):
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            return None
+
+
+class JSONResponse:
+    def __init__(self, payload, status=200, headers=None):
+        self.body = encode_json(payload)
+        self.status = status
+        self.headers = dict(headers or {})
+
+    @classmethod
+    def raw(cls, body, status=200, headers=None):
+        # Cuerpo ya codificado (p. ej. el documento de favoritos)
+        response = cls(None, status, headers)
+        response.body = body
+        return response
+
+    async def send(self, send):
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(self.body)).encode())]
+        headers += [(name.lower().encode(), value.encode()) for name, value in self.headers.items()]
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+class StreamingResponse:
+    def __init__(self, chunks, media_type):
+        self.chunks = chunks
+        self.status = 200
+        self.media_type = media_type
+
+    async def send(self, send):
+        await send({'type': 'http.response.start', 'status': self.status,
+                    'headers': [(b'content-type', self.media_type.encode())]})
+        async for chunk in self.chunks:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+class AsyncAPI:
+    def __init__(self):
+        self.engine = None
+        self.cache = None
+        self.routes = []
+        self._startup_lock = asyncio.Lock()
+
+    def route(self, method, pattern):
+        regex = re.compile('^' + re.sub(r'<int:(\w+)>', r'(?P<\1>\\d+)', pattern) + '$')
+
+        def decorator(handler):
+            self.routes.append((method, regex, handler))
+            return handler
+        return decorator
+
+    async def startup(self):
+        async with self._startup_lock:
+            if self.engine is None:
+                self._start()
+
+    def _start(self):
+        url = async_database_url()
+        self.engine = create_async_engine(url, **async_engine_options(url))
+        # Sólo para invalidar: así los workers WSGI que comparten la caché no sirven datos viejos
+        if os.getenv('CACHE_ENABLED', '1') != '0':
+            self.cache = ResponseCache(create_backend({
+                'CACHE_BACKEND': os.getenv('CACHE_BACKEND', 'memory'),
+                'CACHE_URL': os.getenv('CACHE_URL'),
+                'CACHE_MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 4096)),
+                'CACHE_TTL': int(os.getenv('CACHE_TTL', 300)),
+            }))
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def dispatch(self, request):
+        allowed = False
+        for method, regex, handler in self.routes:
+            match = regex.match(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method == request.method:
+                kwargs = {name: int(value) for name, value in match.groupdict().items()}
+                try:
+                    return await handler(request, **kwargs)
+                except APIException as error:
+                    return JSONResponse(error.to_dict(), status=error.status_code)
+                except Exception:
+                    # Como Flask: se registra la traza y el cliente recibe un 500 en JSON
+                    logger.exception("Unhandled error in %s %s", request.method, request.path)
+                    return JSONResponse({"msg": "Internal server error"}, status=500)
+        if allowed:
+            return JSONResponse({"msg": "Method not allowed"}, status=405)
+        return JSONResponse({"msg": "Not found"}, status=404)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await self.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] != 'http':
+            return
+        if self.engine is None:
+            await self.startup()
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        response = await self.dispatch(Request(scope, body))
+        await response.send(send)
+
+    async def favorites_changed(self, user_id):
+        # Tras el commit de una escritura de favoritos (versión y documento ya
+        # actualizados por favorites.py, como en la app WSGI)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.invalidate_favorites, user_id)
+            await asyncio.to_thread(self.cache.forget_versions, [favorites_version_key(user_id)])
+
+
+application = AsyncAPI()
+
+
+async def _collection(request, model, kind=None):
+    if kind is not None and 'ids' in request.args:
+        parsed = [(kind, entity_id, True) for entity_id in parse_ids(request.args['ids'])]
+        return JSONResponse.raw(await _multiget(parsed))
+    query = parse_list_args(model, request.args)
+    if request.wants_stream():
+        return _stream(request, model, query)
+    async with application.engine.connect() as conn:
+        rows = await conn.run_sync(
+            lambda sync_conn: fetch_list_rows(lambda stmt: sync_conn.execute(stmt).all(), model, query))
+
+    headers = {}
+    if len(rows) > query.limit:
+        next_after = encode_cursor(query.sort, rows[query.limit - 1])
+        query_string = urlencode({**request.args, 'after': next_after})
+        headers['Link'] = f'<{request.path}?{query_string}>; rel="next"'
+        headers['X-Next-Cursor'] = str(next_after)
+    return JSONResponse([dict(zip(query.fields, row)) for row in rows[:query.limit]], headers=headers)
+
+def _stream(request, model, query):
+    # Un cursor del servidor como en la app WSGI; la conexión vive lo que dura el cuerpo
+    async def batches():
+        async with application.engine.connect() as conn:
+            for stmt in list_statements(model, query):
+                result = await conn.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+                async for batch in result.partitions():
+                    yield [dict(zip(query.fields, row)) for row in batch]
+
+    async def chunks():
+        if request.wants_ndjson():
+            async for batch in batches():
+                yield ndjson_chunk(batch)
+            return
+        yield b"["
+        separator = b""
+        async for batch in batches():
+            yield separator + json_array_chunk(batch)
+            separator = b","
+        yield b"]"
+
+    return StreamingResponse(chunks(), NDJSON_MIMETYPE if request.wants_ndjson() else 'application/json')
+
+async def _multiget(parsed):
+    # Mismo cuerpo que multiget.multiget_json, con una consulta IN por tipo
+    bodies = {}
+    async with application.engine.connect() as conn:
+        for kind, ids in multiget_ids(parsed).items():
+            model = ENTITY_KINDS[kind]
+            fields = model.serialize_fields
+            rows = await conn.execute(select(*[getattr(model, name) for name in fields]).where(model.id.in_(ids)))
+            bodies[kind] = {row[0]: encode_json(dict(zip(fields, row))) for row in rows}
+    return multiget_body(parsed, bodies)
+
+async def _entity(model, entity_id, not_found):
+    fields = model.serialize_fields
+    stmt = select(*[getattr(model, name) for name in fields]).where(model.id == entity_id)
+    async with application.engine.connect() as conn:
+        row = (await conn.execute(stmt)).first()
+    if row is None:
+        return JSONResponse({"msg": not_found}, status=404)
+    return JSONResponse(dict(zip(fields, row)))
+
+async def _user_exists(conn, user_id):
+    return (await conn.execute(select(User.id).where(User.id == user_id))).first() is not None
+
+async def _list_favorites(conn, kind, user_id):
+    fields = FAVORITE_KINDS[kind][0].serialize_fields
+    result = await conn.execute(favorites_statement(kind, user_id))
+    return [dict(zip(fields, row)) for row in result]
+
+
+@application.route('GET', '/people')
+async def get_people(request):
+    return await _collection(request, Character, 'character')
+
+@application.route('GET', '/people/<int:people_id>')
+async def get_person(request, people_id):
+    return await _entity(Character, people_id, "Character not found")
+
+@application.route('GET', '/planets')
+async def get_planets(request):
+    return await _collection(request, Planet, 'planet')
+
+@application.route('GET', '/planets/<int:planet_id>')
+async def get_planet(request, planet_id):
+    return await _entity(Planet, planet_id, "Planet not found")
+
+@application.route('GET', '/vehicles')
+async def get_vehicles(request):
+    return await _collection(request, Vehicle, 'vehicle')
+
+@application.route('GET', '/vehicles/<int:vehicle_id>')
+async def get_vehicle(request, vehicle_id):
+    return await _entity(Vehicle, vehicle_id, "Vehicle not found")
+
+@application.route('GET', '/search')
+async def search(request):
+    tokens, kinds, limit = parse_search_args(request.args)
+    async with application.engine.connect() as conn:
+        results = await conn.run_sync(search_catalog, tokens, kinds, limit)
+    return JSONResponse({"query": " ".join(tokens), "results": results})
+
+@application.route('POST', '/batch')
+async def multiget(request):
+    return JSONResponse.raw(await _multiget(parse_multiget(request.json())))
+
+async def _popular(request, kind):
+    fields = FAVORITE_KINDS[kind][0].serialize_fields
+    async with application.engine.connect() as conn:
+        rows = (await conn.execute(popular_statement(kind, parse_popular_limit(request.args)))).all()
+    return JSONResponse([{**dict(zip(fields, row)), 'favorites': row[-1]} for row in rows])
+
+@application.route('GET', '/popular/people')
+async def get_popular_people(request):
+    return await _popular(request, 'character')
+
+@application.route('GET', '/popular/planets')
+async def get_popular_planets(request):
+    return await _popular(request, 'planet')
+
+@application.route('GET', '/popular/vehicles')
+async def get_popular_vehicles(request):
+    return await _popular(request, 'vehicle')
+
+@application.route('GET', '/users')
+async def get_users(request):
+    return await _collection(request, User)
+
+@application.route('GET', '/users/<int:user_id>')
+async def get_user(request, user_id):
+    return await _entity(User, user_id, "User not found")
+
+@application.route('GET', '/users/favorites')
+async def get_user_favorites(request):
+    current_user_id = get_current_user_id()
+    async with application.engine.connect() as conn:
+        if not await _user_exists(conn, current_user_id):
+            return JSONResponse({"msg": "User not found"}, status=404)
+        return JSONResponse.raw(await conn.run_sync(favorites_document, current_user_id))
+
+@application.route('GET', '/favorite/planets')
+async def get_favorite_planets(request):
+    current_user_id = get_current_user_id()
+    async with application.engine.connect() as conn:
+        if not await _user_exists(conn, current_user_id):
+            return JSONResponse({"msg": "User not found"}, status=404)
+        return JSONResponse(await _list_favorites(conn, 'planet', current_user_id))
+
+@application.route('GET', '/favorite/people')
+async def get_favorite_people(request):
+    current_user_id = get_current_user_id()
+    async with application.engine.connect() as conn:
+        if not await _user_exists(conn, current_user_id):
+            return JSONResponse({"msg": "User not found"}, status=404)
+        return JSONResponse(await _list_favorites(conn, 'character', current_user_id))
+
+
+async def _add_favorite(request, kind, field, missing_msg, added_msg, duplicate_msg):
+    data = request.json() or {}
+    current_user_id = get_current_user_id()
+    target_id = data.get(field) if isinstance(data, dict) else None
+    if not target_id:
+        return JSONResponse({"msg": missing_msg}, status=400)
+
+    async with application.engine.begin() as conn:
+        inserted = await conn.run_sync(insert_favorite, kind, current_user_id, target_id)
+    if not inserted:
+        return JSONResponse({"error": duplicate_msg}, status=409)
+    await application.favorites_changed(current_user_id)
+    return JSONResponse({"msg": added_msg}, status=201)
+
+@application.route('POST', '/favorite/people')
+async def add_favorite_character(request):
+    return await _add_favorite(request, 'character', 'character_id', "Character ID is required",
+                               "Favorite character added", "El usuario ya tiene este personaje como favorito")
+
+@application.route('POST', '/favorite/planet')
+async def add_favorite_planet(request):
+    return await _add_favorite(request, 'planet', 'planet_id', "Planet ID is required",
+                               "Favorite planet added", "El usuario ya tiene este planeta como favorito")
+
+@application.route('POST', '/favorite/vehicle')
+async def add_favorite_vehicle(request):
+    return await _add_favorite(request, 'vehicle', 'vehicle_id', "Vehicle ID is required",
+                               "Favorite vehicle added", "El usuario ya tiene este vehículo como favorito")
+
+
+async def _favorites_batch(request, write):
+    parsed = parse_batch(request.json())
+    current_user_id = get_current_user_id()
+    async with application.engine.begin() as conn:
+        results, changed = await conn.run_sync(write, current_user_id, parsed)
+    if changed:
+        await application.favorites_changed(current_user_id)
+    return JSONResponse({"results": results})
+
+@application.route('POST', '/users/favorites/batch')
+async def add_favorites_in_batch(request):
+    return await _favorites_batch(request, insert_favorites)
+
+@application.route('DELETE', '/users/favorites/batch')
+async def remove_favorites_in_batch(request):
+    return await _favorites_batch(request, delete_favorites)
+
+
+async def _remove_favorite(kind, favorite_id, label):
+    async with application.engine.begin() as conn:
+        user_id = await conn.run_sync(delete_favorite, kind, favorite_id)
+    if user_id is None:
+        return JSONResponse({"msg": f"Favorite {label} not found"}, status=404)
+    await application.favorites_changed(user_id)
+    return JSONResponse({"msg": f"Favorite {label} removed"})
+
+@application.route('DELETE', '/favorite/people/<int:favorite_id>')
+async def remove_favorite_character(request, favorite_id):
+    return await _remove_favorite('character', favorite_id, 'character')
+
+@application.route('DELETE', '/favorite/planet/<int:favorite_id>')
+async def remove_favorite_planet(request, favorite_id):
+    return await _remove_favorite('planet', favorite_id, 'planet')
+
+@application.route('DELETE', '/favorite/vehicle/<int:favorite_id>')
+async def remove_favorite_vehicle(request, favorite_id):
+    return await _remove_favorite('vehicle', favorite_id, 'vehicle')
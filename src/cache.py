@@ -0,0 +1,409 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from .models import db, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
+from .cache_backends import create_backend, CacheEntry
+from . import json_provider
+from .metrics import REGISTRY
+
+CACHED_MODELS = (Character, Planet, Vehicle)
+FAVORITE_MODELS = (FavoriteCharacter, FavoritePlanet, FavoriteVehicle)
+
+CACHE_COALESCED = REGISTRY.counter(
+    'api_cache_coalesced_total', 'Cache misses served by another request computing the same key',
+    ('scope',))
+CACHE_STALE_SERVED = REGISTRY.counter(
+    'api_cache_stale_served_total', 'Expired entries served while they are refreshed in the background')
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class ResponseCache:
+    """Guarda cuerpos JSON ya serializados por entidad, por página de colección
+    y por lista de favoritos de cada usuario, sobre un `CacheBackend`.
+
+    Todas las claves llevan la versión de ResourceVersion leída al empezar la
+    petición (`resource_version`, la misma del ETag), antes que los datos: lo
+    que se guarda bajo una versión es como mínimo ese estado, aunque la lectura
+    venga de una réplica con retraso o termine después de una escritura. Las
+    páginas y los favoritos llevan además números de generación en el backend
+    (con un backend compartido el incremento llega a todos los workers).
+
+    Cada entrada guarda (fresca_hasta, valor). Tras caducar se sigue sirviendo
+    durante `stale_ttl` segundos mientras un hilo la recalcula (stale-while-
+    revalidate): los datos no han cambiado, porque un cambio cambia la clave. En un fallo, las peticiones simultáneas de la misma clave esperan
+    al cálculo de una sola (single-flight); con `shared_locks` y un backend
+    compartido también entre workers, con un cerrojo `lock:<clave>` en el backend.
+    Quien espera más de `lock_timeout` segundos calcula el valor por su cuenta.
+
+    También guarda las versiones de ResourceVersion (`version:<clave>`) durante
+    `version_ttl` segundos: un acierto no cuesta ninguna consulta. Quien las
+    incrementa (`bump_versions`) las borra al hacer flush y otra vez tras el
+    commit; el TTL acota lo que tarda en verse una escritura en otro worker
+    con el backend memory, o si una lectura anterior al commit guarda la
+    versión vieja justo después del borrado.
+    """
+
+    def __init__(self, backend, stale_ttl=0, lock_timeout=5.0, shared_locks=True, version_ttl=5):
+        self.backend = backend
+        self.version_ttl = version_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.shared_locks = shared_locks and backend.shared
+        self._flights = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def entity_key(self, model, version, entity_id):
+        return f"entity:{model.__tablename__}:{version}:{entity_id}"
+
+    def page_key(self, model, version, *parts):
+        namespace = model.__tablename__
+        return (f"page:{namespace}:{version}:{self.backend.counter('gen:' + namespace)}:"
+                + ":".join(str(part) for part in parts))
+
+    def favorites_key(self, user_id, version, *parts):
+        # Depende tanto de los favoritos del usuario como del catálogo referenciado
+        user_generation = self.backend.counter(f"gen:favorites:{user_id}")
+        catalog_generation = self.backend.counter("gen:catalog")
+        return (f"favorites:{user_id}:{version}:{user_generation}:{catalog_generation}:"
+                + ":".join(str(part) for part in parts))
+
+    def compressed_key(self, encoding, body):
+        # Por contenido: una versión nueva tiene otro hash y no hace falta invalidar
+        return f"compressed:{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}"
+
+    def _entry(self, value):
+        return CacheEntry(time.time() + self.backend.ttl, value)
+
+    def _get(self, key):
+        entry = self.backend.get(key)
+        return entry if isinstance(entry, CacheEntry) else None
+
+    def _store(self, key, value):
+        if value is not None:
+            self.backend.set(key, self._entry(value), ttl=self.backend.ttl + self.stale_ttl)
+        return value
+
+    def _store_many(self, items):
+        self.backend.set_many({key: self._entry(value) for key, value in items.items() if value is not None},
+                              ttl=self.backend.ttl + self.stale_ttl)
+
+    def get_or_set(self, key, producer):
+        entry = self._get(key)
+        if entry is None:
+            return self._single_flight(key, producer)
+        fresh_until, value = entry
+        if fresh_until < time.time():
+            CACHE_STALE_SERVED.inc()
+            # El refresco guarda bajo esta misma clave (la versión vista al empezar
+            # la petición): aunque una escritura termine antes que él, su lectura
+            # es posterior a esa versión y nunca deja datos viejos bajo una nueva
+            self._revalidate(key, lambda: self._store(key, producer()), 'lock:' + key)
+        return value
+
+    def get_or_set_many(self, keys, producer):
+        """Como `get_or_set` para varias claves: `keys` es {id: clave} y
+        `producer(ids)` devuelve {id: valor} de los ids que falten."""
+        cached = {key: entry for key, entry in self.backend.get_many(list(keys.values())).items()
+                  if isinstance(entry, CacheEntry)}
+        now = time.time()
+        values = {item: cached[key][1] for item, key in keys.items() if key in cached}
+        missing = [item for item in keys if item not in values]
+        if missing:
+            produced = producer(missing)
+            self._store_many({keys[item]: value for item, value in produced.items()})
+            values.update(produced)
+        stale = [item for item, key in keys.items() if key in cached and cached[key][0] < now]
+        if stale:
+            CACHE_STALE_SERVED.inc(amount=len(stale))
+            self._revalidate(tuple(keys[item] for item in stale),
+                             lambda: self._store_many({keys[item]: value for item, value in producer(stale).items()}))
+        return values
+
+    def _single_flight(self, key, producer):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            # Otra petición de este proceso ya lo está calculando
+            if flight.done.wait(self.lock_timeout) and not flight.failed:
+                CACHE_COALESCED.inc('process')
+                return flight.value
+            return producer()
+
+        try:
+            flight.value = self._produce(key, producer)
+            return flight.value
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _produce(self, key, producer):
+        if not self.shared_locks:
+            return self._store(key, producer())
+        lock_key = 'lock:' + key
+        if self.backend.add(lock_key, os.getpid(), ttl=max(1, round(self.lock_timeout))):
+            try:
+                return self._store(key, producer())
+            finally:
+                self.backend.delete(lock_key)
+
+        # Otro worker lo está calculando: esperamos a que aparezca la entrada
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.005
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+            entry = self._get(key)
+            if entry is not None:
+                CACHE_COALESCED.inc('shared')
+                return entry[1]
+            if self.backend.get(lock_key) is None:
+                break
+        return self._store(key, producer())
+
+    def _revalidate(self, flight_key, refresh, lock_key=None):
+        """Ejecuta `refresh` en un hilo con su propio contexto de aplicación;
+        una sola vez a la vez por clave (y por backend, con `lock_key`).
+
+        `refresh` escribe en claves ya calculadas por la petición, con su
+        versión: el hilo no vuelve a leer versiones.
+        """
+        with self._lock:
+            if flight_key in self._refreshing:
+                return
+            self._refreshing.add(flight_key)
+        if self.shared_locks and lock_key is not None and \
+                not self.backend.add(lock_key, os.getpid(), ttl=max(1, round(self.lock_timeout))):
+            with self._lock:
+                self._refreshing.discard(flight_key)
+            return
+
+        app = current_app._get_current_object()
+
+        def run():
+            try:
+                with app.app_context():
+                    refresh()
+            except Exception:
+                app.logger.exception("Background cache refresh failed")
+            finally:
+                if self.shared_locks and lock_key is not None:
+                    self.backend.delete(lock_key)
+                with self._lock:
+                    self._refreshing.discard(flight_key)
+
+        threading.Thread(target=run, name='cache-revalidate', daemon=True).start()
+
+    def versions(self, keys):
+        """{clave: (versión, updated_at)} de las claves de ResourceVersion que estén en la caché."""
+        found = self.backend.get_many(['version:' + key for key in keys])
+        return {key[len('version:'):]: (value[0], datetime.fromisoformat(value[1]) if value[1] else None)
+                for key, value in found.items() if isinstance(value, list) and len(value) == 2}
+
+    def store_versions(self, versions):
+        if self.version_ttl:
+            self.backend.set_many({'version:' + key: [version, updated_at.isoformat() if updated_at else None]
+                                   for key, (version, updated_at) in versions.items()}, ttl=self.version_ttl)
+
+    def forget_versions(self, keys):
+        self.backend.delete_many(['version:' + key for key in keys])
+
+    def invalidate(self, model):
+        # Las entidades no hace falta borrarlas: la escritura cambia la versión de su clave
+        self.backend.incr('gen:' + model.__tablename__)
+        self.backend.incr('gen:catalog')
+
+    def invalidate_favorites(self, user_id):
+        self.backend.incr(f"gen:favorites:{user_id}")
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def init_cache(app):
+    app.config.setdefault('CACHE_ENABLED', os.getenv('CACHE_ENABLED', '1') != '0')
+    app.config.setdefault('CACHE_MAX_ENTRIES', int(os.getenv('CACHE_MAX_ENTRIES', 4096)))
+    app.config.setdefault('CACHE_TTL', int(os.getenv('CACHE_TTL', 300)))
+    # memory (por proceso) | sqlite (fichero compartido) | redis
+    app.config.setdefault('CACHE_BACKEND', os.getenv('CACHE_BACKEND', 'memory'))
+    app.config.setdefault('CACHE_URL', os.getenv('CACHE_URL'))
+    # Segundos que se sirve una entrada caducada mientras se recalcula en segundo plano
+    app.config.setdefault('CACHE_STALE_TTL', int(os.getenv('CACHE_STALE_TTL', 60)))
+    # Espera máxima al cálculo de otra petición de la misma clave
+    app.config.setdefault('CACHE_LOCK_TIMEOUT', float(os.getenv('CACHE_LOCK_TIMEOUT', 5)))
+    # Single-flight también entre workers (sólo con backends compartidos: sqlite, redis)
+    app.config.setdefault('CACHE_SHARED_LOCKS', os.getenv('CACHE_SHARED_LOCKS', '1') != '0')
+    # Segundos que se guardan las versiones (ETag) sin volver a leerlas de la base de datos
+    app.config.setdefault('CACHE_VERSION_TTL', int(os.getenv('CACHE_VERSION_TTL', 5)))
+
+    cache = None
+    if app.config['CACHE_ENABLED']:
+        cache = ResponseCache(create_backend(app.config), app.config['CACHE_STALE_TTL'],
+                              app.config['CACHE_LOCK_TIMEOUT'], app.config['CACHE_SHARED_LOCKS'],
+                              app.config['CACHE_VERSION_TTL'])
+    app.extensions['response_cache'] = cache
+    return cache
+
+def get_cache(model=None):
+    if not has_app_context():
+        return None
+    if model is not None and model not in CACHED_MODELS:
+        return None
+    return current_app.extensions.get('response_cache')
+
+def encode_json(obj):
+    # Fuera de una petición de Flask (modo ASGI) con los mismos ajustes
+    dumps = current_app.json.dumps_bytes if has_app_context() else json_provider.dumps_bytes
+    return dumps(obj) + b"\n"
+
+def decode_json(data):
+    return current_app.json.loads(data) if has_app_context() else json_provider.loads(data)
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+def table_version(model):
+    # Importación diferida: versions -> pagination -> cache
+    from .versions import resource_version
+    return resource_version((model.__tablename__,))[0]
+
+def get_entity_json(model, entity_id):
+    """Bytes JSON de `model.serialize()` para el id dado, o None si no existe."""
+    def load():
+        entity = db.session.get(model, entity_id)
+        return encode_json(entity.serialize()) if entity is not None else None
+
+    cache = get_cache(model)
+    if cache is None:
+        return load()
+    return cache.get_or_set(cache.entity_key(model, table_version(model), entity_id), load)
+
+def get_entities_json(model, entity_ids):
+    """{id: bytes JSON} de las entidades de `entity_ids` que existen, con una
+    sola consulta IN para las que no estén en la caché (mismas entradas que
+    `get_entity_json`)."""
+    def load(ids):
+        entities = db.session.scalars(select(model).where(model.id.in_(ids)))
+        return {entity.id: encode_json(entity.serialize()) for entity in entities}
+
+    cache = get_cache(model)
+    if cache is None:
+        return load(entity_ids)
+    version = table_version(model)
+    return cache.get_or_set_many({entity_id: cache.entity_key(model, version, entity_id) for entity_id in entity_ids},
+                                 load)
+
+
+def get_favorites_json(user_id, kind, producer, encoded=False):
+    """Bytes JSON de la lista de favoritos `kind` del usuario (ver `favorites.py`);
+    con `encoded`, `producer` ya devuelve los bytes."""
+    def load():
+        return producer() if encoded else encode_json(producer())
+
+    cache = get_cache()
+    if cache is None:
+        return load()
+    from .versions import resource_version, favorites_version_keys
+    version = resource_version(favorites_version_keys(user_id))[0]
+    return cache.get_or_set(cache.favorites_key(user_id, version, kind), load)
+
+
+def _cache_samples():
+    cache = get_cache()
+    if cache is None:
+        return []
+    stats = cache.stats()
+    labels = {'backend': stats['backend']}
+    samples = [
+        ('api_cache_hits_total', 'Response cache hits in this process', 'counter', [(labels, stats['hits'])]),
+        ('api_cache_misses_total', 'Response cache misses in this process', 'counter', [(labels, stats['misses'])]),
+    ]
+    if 'entries' in stats:
+        samples.append(('api_cache_entries', 'Entries currently stored', 'gauge', [(labels, stats['entries'])]))
+    return samples
+
+REGISTRY.add_collector(_cache_samples)
+
+
+# Invalidación automática: cualquier escritura ORM (API o Flask-Admin) sobre
+# el catálogo o los favoritos incrementa las generaciones afectadas, en el
+# flush y otra vez tras el commit (igual que las versiones guardadas, ver
+# `versions_changed`). Lo que impide guardar datos viejos bajo una clave nueva
+# es la versión de ResourceVersion en la clave (ver ResponseCache).
+# Las escrituras Core (INSERT ... ON CONFLICT) no disparan eventos de mapper y
+# llaman a `schedule_invalidation` directamente.
+def _apply(cache, invalidation):
+    kind, *args = invalidation
+    if kind == 'catalog':
+        cache.invalidate(*args)
+    elif kind == 'versions':
+        cache.forget_versions(*args)
+    else:
+        cache.invalidate_favorites(*args)
+
+def schedule_invalidation(session, invalidation):
+    cache = get_cache()
+    if cache is None:
+        return
+    _apply(cache, invalidation)
+    session.info.setdefault('cache_invalidations', set()).add(invalidation)
+
+def invalidate_favorites(user_id, session=None):
+    schedule_invalidation(session or db.session(), ('favorites', user_id))
+
+def versions_changed(keys, session=None):
+    # Fuera de la app Flask (modo ASGI) no hay sesión: lo hace AsyncAPI.favorites_changed
+    if has_app_context():
+        schedule_invalidation(session or db.session(), ('versions', tuple(sorted(keys))))
+
+def _invalidate_catalog(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        schedule_invalidation(session, ('catalog', mapper.class_))
+
+def _invalidate_favorites(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        schedule_invalidation(session, ('favorites', target.user_id))
+
+for _model in CACHED_MODELS:
+    event.listen(_model, 'after_insert', _invalidate_catalog)
+    event.listen(_model, 'after_update', _invalidate_catalog)
+    event.listen(_model, 'after_delete', _invalidate_catalog)
+
+for _model in FAVORITE_MODELS:
+    event.listen(_model, 'after_insert', _invalidate_favorites)
+    event.listen(_model, 'after_update', _invalidate_favorites)
+    event.listen(_model, 'after_delete', _invalidate_favorites)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    pending = session.info.pop('cache_invalidations', None)
+    cache = get_cache()
+    if pending and cache is not None:
+        for invalidation in pending:
+            _apply(cache, invalidation)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,433 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+
+# Valor guardado por ResponseCache; lo que no sea un CacheEntry (p. ej. de una
+# versión anterior en un backend compartido) cuenta como fallo
+CacheEntry = namedtuple('CacheEntry', ('fresh_until', 'value'))
+
+# Formato de los valores en los backends compartidos, sin pickle: quien pueda
+# escribir en Redis o en el fichero de caché no debe poder ejecutar código en
+# los workers. Lo que se guarda son cuerpos ya serializados y unos pocos campos:
+#   b'E' + (fresca_hasta, longitud de los extras) + extras JSON + cuerpo  -> CacheEntry
+#       (el valor es el cuerpo o, con extras, la tupla (cuerpo, *extras))
+#   b'J' + JSON                                                            -> resto (cerrojos, marcas)
+_ENTRY_HEADER = struct.Struct('!dI')
+
+
+def encode_value(value):
+    if isinstance(value, CacheEntry):
+        body, extras = value.value, b''
+        if isinstance(body, tuple):
+            body, extras = body[0], json.dumps(body[1:], separators=(',', ':')).encode()
+        return b'E' + _ENTRY_HEADER.pack(value.fresh_until, len(extras)) + extras + body
+    return b'J' + json.dumps(value, separators=(',', ':')).encode()
+
+def decode_value(raw):
+    """Valor de `encode_value`, o None si no se reconoce (se trata como un fallo)."""
+    raw = bytes(raw)
+    try:
+        if raw[:1] == b'E':
+            fresh_until, length = _ENTRY_HEADER.unpack_from(raw, 1)
+            start = 1 + _ENTRY_HEADER.size
+            body = raw[start + length:]
+            if length:
+                return CacheEntry(fresh_until, (body, *json.loads(raw[start:start + length])))
+            return CacheEntry(fresh_until, body)
+        if raw[:1] == b'J':
+            return json.loads(raw[1:])
+    except (struct.error, ValueError):
+        pass
+    return None
+
+
+class CacheBackend:
+    """Interfaz común de los almacenes de caché.
+
+    `get`/`set`/`delete` manejan valores con TTL (un `CacheEntry` o datos JSON;
+    los backends compartidos los guardan con `encode_value`); `incr`/`counter`
+    manejan contadores enteros que nunca se desalojan (se usan como números de
+    generación, así que deben ser visibles para todos los workers que compartan
+    el backend).
+    """
+
+    shared = False
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+    def add(self, key, value, ttl=None):
+        """Guarda `value` sólo si `key` no existe (o ha caducado); True si lo guardó.
+
+        Es atómico entre todos los que comparten el backend: sirve de cerrojo.
+        """
+        raise NotImplementedError()
+
+    def get_many(self, keys):
+        """Dict clave -> valor con las claves presentes (sin los fallos)."""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, items, ttl=None):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
+    def incr(self, key):
+        raise NotImplementedError()
+
+    def counter(self, key):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def stats(self):
+        raise NotImplementedError()
+
+
+class MemoryBackend(CacheBackend):
+    """Caché LRU en memoria con TTL y contadores de aciertos/fallos (por proceso)."""
+
+    def __init__(self, max_entries=4096, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            values = {key: self._get(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def _set(self, key, value, expires_at):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+    def _trim(self):
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set(key, value, time.monotonic() + (ttl or self.ttl))
+            self._trim()
+
+    def set_many(self, items, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            for key, value in items.items():
+                self._set(key, value, expires_at)
+            self._trim()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def add(self, key, value, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= now:
+                return False
+            self._set(key, value, now + (ttl or self.ttl))
+            self._trim()
+            return True
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SQLiteBackend(CacheBackend):
+    """Caché compartida entre procesos sobre un fichero SQLite local (modo WAL).
+
+    Todos los workers de gunicorn de la máquina abren el mismo fichero, así que
+    hay una sola copia de cada entrada y los contadores de generación (y por
+    tanto las invalidaciones) se ven en todos ellos.
+    """
+
+    shared = True
+
+    def __init__(self, path, max_entries=100000, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_entry ("
+                     "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                     "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_counter (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connection(self):
+        # Una conexión por hilo y por proceso: nunca se reutiliza tras un fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, accessed_at FROM cache_entry WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # LRU aproximado: sólo reescribimos accessed_at una vez por segundo
+        if now - row[1] > 1:
+            self._connection().execute("UPDATE cache_entry SET accessed_at = ? WHERE key = ?", (now, key))
+        return decode_value(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                     (key, encode_value(value), now + (ttl or self.ttl), now))
+        self._sets += 1
+        if self._sets % 100 == 0:
+            self._evict(conn, now)
+
+    def get_many(self, keys):
+        now = time.time()
+        conn = self._connection()
+        values = {}
+        # Por tramos: SQLite limita el número de parámetros de una sentencia
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(f"SELECT key, value FROM cache_entry WHERE key IN ({', '.join('?' * len(chunk))}) "
+                                f"AND expires_at > ?", (*chunk, now)).fetchall()
+            values.update((key, decode_value(value)) for key, value in rows)
+        self.hits += len(values)
+        self.misses += len(keys) - len(values)
+        return values
+
+    def set_many(self, items, ttl=None):
+        now = time.time()
+        expires_at = now + (ttl or self.ttl)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO cache_entry (key, value, expires_at, accessed_at) "
+                             "VALUES (?, ?, ?, ?)",
+                             ((key, encode_value(value), expires_at, now)
+                              for key, value in items.items()))
+        previous, self._sets = self._sets, self._sets + len(items)
+        if previous // 100 != self._sets // 100:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM cache_entry WHERE key IN ("
+                         "SELECT key FROM cache_entry ORDER BY accessed_at LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        # Sólo reemplaza una entrada caducada: rowcount es 0 si la clave sigue viva
+        cursor = self._connection().execute(
+            "INSERT INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, "
+            "accessed_at = excluded.accessed_at WHERE cache_entry.expires_at <= ?",
+            (key, encode_value(value), now + (ttl or self.ttl), now, now))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM cache_entry WHERE key = ?", ((key,) for key in keys))
+
+    def incr(self, key):
+        conn = self._connection()
+        conn.execute("INSERT INTO cache_counter (key, value) VALUES (?, 1) "
+                     "ON CONFLICT (key) DO UPDATE SET value = value + 1", (key,))
+        return self.counter(key)
+
+    def counter(self, key):
+        row = self._connection().execute("SELECT value FROM cache_counter WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+    def stats(self):
+        entries = self._connection().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class RedisBackend(CacheBackend):
+    """Caché compartida sobre Redis (o cualquier servidor compatible con su protocolo).
+
+    Requiere el paquete opcional `redis`. El desalojo LRU lo hace el propio
+    servidor (`maxmemory-policy allkeys-lru`).
+    """
+
+    shared = True
+
+    def __init__(self, url, ttl=300, prefix='api-cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_value(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, encode_value(value), ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, encode_value(value),
+                                    ex=ttl or self.ttl, nx=True))
+
+    def get_many(self, keys):
+        values = {}
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            for key, raw in zip(chunk, self.client.mget([self.prefix + key for key in chunk])):
+                if raw is not None:
+                    values[key] = decode_value(raw)
+        self.hits += len(values)
+        self.misses += len(keys) - len(values)
+        return values
+
+    def set_many(self, items, ttl=None):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.set(self.prefix + key, encode_value(value), ex=ttl or self.ttl)
+        pipeline.execute()
+
+    def delete_many(self, keys):
+        keys = [self.prefix + key for key in keys]
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + 'counter:' + key) or 0)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            if not key.decode().startswith(self.prefix + 'counter:'):
+                self.client.delete(key)
+
+    def stats(self):
+        return {
+            'backend': 'redis',
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def create_backend(config):
+    kind = config['CACHE_BACKEND']
+    if kind == 'memory':
+        return MemoryBackend(config['CACHE_MAX_ENTRIES'], config['CACHE_TTL'])
+    if kind == 'sqlite':
+        return SQLiteBackend(config['CACHE_URL'] or '/tmp/api-cache.db', config['CACHE_MAX_ENTRIES'], config['CACHE_TTL'])
+    if kind == 'redis':
+        return RedisBackend(config['CACHE_URL'] or 'redis://localhost:6379/0', config['CACHE_TTL'])
+    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
@@ -0,0 +1,149 @@
+"""Compresión de respuestas negociada con Accept-Encoding.
+
+Se comprimen las respuestas JSON, NDJSON, HTML y texto de al menos
+COMPRESSION_MIN_SIZE bytes con la mejor codificación que acepte el cliente
+entre COMPRESSION_ENCODINGS (por orden de preferencia del servidor): br y zstd
+si están instalados `brotli` y `zstandard`, gzip siempre. br va primero
+porque da los cuerpos más pequeños (el coste de CPU se amortiza con la caché).
+
+- Respuestas en streaming (?stream=1, NDJSON): se comprime cada bloque y se
+  vacía el compresor, así el cliente sigue recibiendo filas a medida que salen.
+- Con la caché de respuestas activa, el cuerpo comprimido se guarda con clave
+  el hash del cuerpo original: cada versión se comprime una sola vez por
+  codificación aunque la pidan muchos clientes.
+- Un ETag fuerte pasa a débil al comprimir (la representación cambia); las
+  peticiones condicionales usan la comparación débil.
+"""
+import os
+import zlib
+import gzip
+from flask import request
+from .cache import get_cache
+
+try:
+    import brotli
+except ImportError:  # opcional: sin él no se ofrece br
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # opcional: sin él no se ofrece zstd
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain')
+DEFAULT_MIN_SIZE = 1024
+# Niveles pensados para respuestas dinámicas: buena razón sin disparar la CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def compress(self, data):
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            block = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if block:
+                yield block
+        yield compressor.flush()
+
+class BrotliEncoder:
+    name = 'br'
+
+    def compress(self, data):
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            block = compressor.process(chunk) + compressor.flush()
+            if block:
+                yield block
+        yield compressor.finish()
+
+class ZstdEncoder:
+    name = 'zstd'
+
+    # ZstdCompressor no es seguro entre hilos: uno por respuesta
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        for chunk in chunks:
+            block = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if block:
+                yield block
+        yield compressor.flush()
+
+
+def available_encoders():
+    encoders = {'gzip': GzipEncoder()}
+    if brotli is not None:
+        encoders['br'] = BrotliEncoder()
+    if zstandard is not None:
+        encoders['zstd'] = ZstdEncoder()
+    return encoders
+
+def negotiate(accept_encodings, encoders):
+    """Codificación elegida para la cabecera Accept-Encoding, o None."""
+    # Entre las de igual calidad gana la primera de `encoders` (preferencia del servidor)
+    return accept_encodings.best_match(list(encoders))
+
+def _compressible(response):
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    return response.mimetype in COMPRESSIBLE_MIMETYPES
+
+def _compressed_body(encoder, body):
+    cache = get_cache()
+    if cache is None:
+        return encoder.compress(body)
+    return cache.get_or_set(cache.compressed_key(encoder.name, body), lambda: encoder.compress(body))
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESSION_ENABLED', os.getenv('COMPRESSION_ENABLED', '1') != '0')
+    app.config.setdefault('COMPRESSION_MIN_SIZE', int(os.getenv('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)))
+    app.config.setdefault('COMPRESSION_ENCODINGS', os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip'))
+    if not app.config['COMPRESSION_ENABLED']:
+        return None
+
+    available = available_encoders()
+    encoders = {name: available[name] for name in app.config['COMPRESSION_ENCODINGS'].split(',')
+                if name in available}
+    min_size = app.config['COMPRESSION_MIN_SIZE']
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.accept_encodings, encoders)
+        if encoding is None:
+            return response
+
+        encoder = encoders[encoding]
+        if response.is_streamed:
+            response.response = encoder.stream(response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            response.set_data(_compressed_body(encoder, body))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return encoders
@@ -0,0 +1,505 @@
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, delete, update, func, literal, event, inspect
+from sqlalchemy.orm import Session
+from .utils import APIException, insert_ignore_statement, upsert_statement
+from .versions import _utcnow, favorites_version_key, bump_versions, bump_many_versions
+from .cache import get_favorites_json, invalidate_favorites, encode_json, decode_json
+from .models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle, FavoriteCount
+from .models import FavoritesDocument, ResourceVersion
+
+# tipo -> (modelo del catálogo, modelo de favorito, columna FK)
+FAVORITE_KINDS = {
+    'character': (Character, FavoriteCharacter, FavoriteCharacter.character_id),
+    'planet': (Planet, FavoritePlanet, FavoritePlanet.planet_id),
+    'vehicle': (Vehicle, FavoriteVehicle, FavoriteVehicle.vehicle_id),
+}
+
+# tipo -> lista del documento de /users/favorites
+DOCUMENT_LISTS = {
+    'character': 'favorite_characters',
+    'planet': 'favorite_planets',
+    'vehicle': 'favorite_vehicles',
+}
+
+MAX_BATCH_SIZE = 1000
+REBUILD_BATCH_SIZE = 500
+DEFAULT_POPULAR_LIMIT = 10
+MAX_POPULAR_LIMIT = 100
+
+def favorites_statement(kind, user_id):
+    # Un único JOIN por tipo en lugar de un SELECT por cada favorito;
+    # se leen tuplas de columnas, sin hidratar objetos ORM
+    model, favorite_model, target_column = FAVORITE_KINDS[kind]
+    return (select(*[getattr(model, name) for name in model.serialize_fields])
+            .join(favorite_model, target_column == model.id)
+            .where(favorite_model.user_id == user_id)
+            .order_by(favorite_model.id))
+
+def list_favorites(kind, user_id):
+    fields = FAVORITE_KINDS[kind][0].serialize_fields
+    return [dict(zip(fields, row)) for row in db.session.execute(favorites_statement(kind, user_id))]
+
+def favorites_json(kind, user_id):
+    return get_favorites_json(user_id, kind, lambda: list_favorites(kind, user_id))
+
+def user_favorites_json(user_id):
+    return get_favorites_json(user_id, 'all', lambda: favorites_document(db.session.connection(), user_id),
+                              encoded=True)
+
+def is_target_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def check_favorite_target(connection, kind, target_id):
+    """400 si `target_id` no es un entero y 404 si la entidad no existe."""
+    model = FAVORITE_KINDS[kind][0]
+    if not is_target_id(target_id):
+        raise APIException(f"{model.__name__} ID must be an integer", status_code=400)
+    if connection.execute(select(model.id).where(model.id == target_id)).first() is None:
+        raise APIException(f"{model.__name__} not found", status_code=404)
+
+# Escrituras de favoritos. Las funciones que reciben `connection` son el
+# camino común de las apps WSGI y ASGI: alta o baja, contador, versión y
+# documento en la transacción de quien llama. La caché la invalida cada app
+# después (Flask al hacer commit, ASGI en `favorites_changed`).
+def insert_favorite(connection, kind, user_id, target_id):
+    # Devuelve False si el favorito ya existía (sin leer antes de escribir)
+    check_favorite_target(connection, kind, target_id)
+    _, favorite_model, target_column = FAVORITE_KINDS[kind]
+    stmt = insert_ignore_statement(favorite_model, connection.dialect.name).values({
+        favorite_model.user_id: user_id,
+        target_column: target_id,
+    })
+    inserted = connection.execute(stmt).rowcount == 1
+    if inserted:
+        update_favorite_counts(connection, kind, {target_id: 1})
+        favorites_changed(connection, user_id, {kind: {target_id: 1}})
+    return inserted
+
+def delete_favorite(connection, kind, favorite_id):
+    """Borra el favorito `favorite_id`; devuelve su usuario o None si no existía."""
+    _, favorite_model, target_column = FAVORITE_KINDS[kind]
+    row = connection.execute(
+        select(favorite_model.user_id, target_column).where(favorite_model.id == favorite_id)).first()
+    if row is None or not connection.execute(delete(favorite_model).where(favorite_model.id == favorite_id)).rowcount:
+        return None
+    update_favorite_counts(connection, kind, {row[1]: -1})
+    favorites_changed(connection, row[0], {kind: {row[1]: -1}})
+    return row[0]
+
+def favorites_changed(connection, user_id, changes):
+    bump_versions(connection, [favorites_version_key(user_id)])
+    update_favorites_document(connection, user_id, changes)
+
+def _write_connection():
+    # Escrituras Core por la conexión de la sesión: cuentan como escritura
+    # para el enrutado a réplicas (primario y read-your-writes, routing.py)
+    db.session.info['wrote'] = True
+    return db.session.connection()
+
+def add_favorite(kind, user_id, target_id):
+    inserted = insert_favorite(_write_connection(), kind, user_id, target_id)
+    if inserted:
+        invalidate_favorites(user_id)
+    return inserted
+
+def remove_favorite(kind, favorite_id):
+    user_id = delete_favorite(_write_connection(), kind, favorite_id)
+    if user_id is not None:
+        invalidate_favorites(user_id)
+    return user_id is not None
+
+def parse_batch(data):
+    """Valida el cuerpo {"favorites": [{"type": "planet", "id": 3}, ...]}.
+
+    Devuelve la lista de (tipo, id, válido) en el orden recibido.
+    """
+    items = data.get('favorites') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise APIException("'favorites' must be a non-empty list of {type, id} objects", status_code=400)
+    if len(items) > MAX_BATCH_SIZE:
+        raise APIException(f"At most {MAX_BATCH_SIZE} favorites per batch", status_code=400)
+
+    parsed = []
+    for item in items:
+        kind = item.get('type') if isinstance(item, dict) else None
+        target_id = item.get('id') if isinstance(item, dict) else None
+        valid = kind in FAVORITE_KINDS and is_target_id(target_id)
+        parsed.append((kind, target_id, valid))
+    return parsed
+
+def _ids_by_kind(parsed):
+    grouped = {}
+    for kind, target_id, valid in parsed:
+        if valid:
+            grouped.setdefault(kind, set()).add(target_id)
+    return grouped
+
+def _batch_results(parsed, statuses, repeated):
+    # Como si los elementos se aplicaran uno a uno: una repetición ve el
+    # efecto de la primera aparición (`repeated` traduce su estado)
+    results = []
+    seen = set()
+    for kind, target_id, valid in parsed:
+        if not valid:
+            status = 'invalid'
+        elif (kind, target_id) in seen:
+            status = repeated.get(statuses[(kind, target_id)], statuses[(kind, target_id)])
+        else:
+            status = statuses[(kind, target_id)]
+            seen.add((kind, target_id))
+        results.append({'type': kind, 'id': target_id, 'status': status})
+    return results
+
+def insert_favorites(connection, user_id, parsed):
+    """Añade todos los favoritos con una consulta de validación y un INSERT
+    multi-fila por tipo. No hace commit: lo hace quien llama, una sola vez."""
+    dialect = connection.dialect
+    statuses = {}
+    changes = {}
+
+    for kind, ids in _ids_by_kind(parsed).items():
+        model, favorite_model, target_column = FAVORITE_KINDS[kind]
+        found = set(connection.scalars(select(model.id).where(model.id.in_(ids))))
+        for target_id in ids - found:
+            statuses[(kind, target_id)] = 'not_found'
+        if not found:
+            continue
+
+        stmt = insert_ignore_statement(favorite_model, dialect.name).values([
+            {'user_id': user_id, target_column.key: target_id} for target_id in sorted(found)
+        ])
+        if dialect.insert_returning:
+            inserted = set(connection.scalars(stmt.returning(target_column)))
+        else:
+            existing = set(connection.scalars(
+                select(target_column).where(favorite_model.user_id == user_id, target_column.in_(found))))
+            connection.execute(stmt)
+            inserted = found - existing
+
+        for target_id in found:
+            statuses[(kind, target_id)] = 'added' if target_id in inserted else 'exists'
+        if inserted:
+            changes[kind] = dict.fromkeys(inserted, 1)
+            update_favorite_counts(connection, kind, changes[kind])
+
+    if changes:
+        favorites_changed(connection, user_id, changes)
+    return _batch_results(parsed, statuses, {'added': 'exists'}), bool(changes)
+
+def delete_favorites(connection, user_id, parsed):
+    dialect = connection.dialect
+    statuses = {}
+    changes = {}
+
+    for kind, ids in _ids_by_kind(parsed).items():
+        _, favorite_model, target_column = FAVORITE_KINDS[kind]
+        stmt = delete(favorite_model).where(favorite_model.user_id == user_id, target_column.in_(ids))
+        if dialect.delete_returning:
+            removed = set(connection.scalars(stmt.returning(target_column)))
+        else:
+            removed = set(connection.scalars(
+                select(target_column).where(favorite_model.user_id == user_id, target_column.in_(ids))))
+            connection.execute(stmt)
+
+        for target_id in ids:
+            statuses[(kind, target_id)] = 'removed' if target_id in removed else 'not_found'
+        if removed:
+            changes[kind] = dict.fromkeys(removed, -1)
+            update_favorite_counts(connection, kind, changes[kind])
+
+    if changes:
+        favorites_changed(connection, user_id, changes)
+    return _batch_results(parsed, statuses, {'removed': 'not_found'}), bool(changes)
+
+def add_favorites_batch(user_id, parsed):
+    results, changed = insert_favorites(_write_connection(), user_id, parsed)
+    if changed:
+        invalidate_favorites(user_id)
+    return results
+
+def remove_favorites_batch(user_id, parsed):
+    results, changed = delete_favorites(_write_connection(), user_id, parsed)
+    if changed:
+        invalidate_favorites(user_id)
+    return results
+
+
+# Contadores de favoritos por entidad (tabla favorite_count). Se actualizan en
+# la misma transacción que el alta o baja del favorito: explícitamente en las
+# escrituras Core de arriba y con eventos de mapper en las del ORM (borrados
+# de la API, Flask-Admin). `flask favorites reconcile` corrige la deriva.
+def update_favorite_counts(connection, kind, deltas):
+    """Suma a cada contador su delta ({entity_id: +1 | -1}); una sentencia por delta."""
+    table = FavoriteCount.__table__
+    by_delta = {}
+    for entity_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(entity_id)
+
+    for delta, ids in by_delta.items():
+        ids = sorted(ids)  # orden fijo de bloqueo entre transacciones concurrentes
+        if delta > 0:
+            # Upsert atómico: si dos transacciones crean a la vez el primer
+            # favorito de una entidad, la segunda suma sobre la fila de la primera
+            stmt = upsert_statement(table, connection.dialect.name, [], key=('kind', 'entity_id'),
+                                    increment=('count',))
+            connection.execute(stmt.values([{'kind': kind, 'entity_id': entity_id, 'count': delta}
+                                            for entity_id in ids]))
+        else:
+            # Una baja siempre tiene fila (la creó el alta): basta el UPDATE
+            connection.execute(update(table)
+                               .where(table.c.kind == kind, table.c.entity_id.in_(ids))
+                               .values(count=table.c.count + delta))
+
+_KIND_BY_FAVORITE_MODEL = {
+    favorite_model: (kind, target_column.key) for kind, (_, favorite_model, target_column) in FAVORITE_KINDS.items()
+}
+
+def _count_inserted(mapper, connection, target):
+    kind, column = _KIND_BY_FAVORITE_MODEL[mapper.class_]
+    update_favorite_counts(connection, kind, {getattr(target, column): 1})
+    _schedule_document_patch(target, kind, {getattr(target, column): 1})
+
+def _count_deleted(mapper, connection, target):
+    kind, column = _KIND_BY_FAVORITE_MODEL[mapper.class_]
+    update_favorite_counts(connection, kind, {getattr(target, column): -1})
+    _schedule_document_patch(target, kind, {getattr(target, column): -1})
+
+def _count_updated(mapper, connection, target):
+    kind, column = _KIND_BY_FAVORITE_MODEL[mapper.class_]
+    history = inspect(target).attrs[column].history
+    if history.has_changes():
+        deltas = {}
+        for entity_id in history.deleted:
+            deltas[entity_id] = deltas.get(entity_id, 0) - 1
+        for entity_id in history.added:
+            deltas[entity_id] = deltas.get(entity_id, 0) + 1
+        update_favorite_counts(connection, kind, deltas)
+        _schedule_document_patch(target, kind, deltas)
+
+for _favorite_model in _KIND_BY_FAVORITE_MODEL:
+    event.listen(_favorite_model, 'after_insert', _count_inserted)
+    event.listen(_favorite_model, 'after_delete', _count_deleted)
+    event.listen(_favorite_model, 'after_update', _count_updated)
+
+
+# Documento de /users/favorites por usuario (tabla favorites_document): la
+# lectura es una búsqueda por clave primaria. El documento vale mientras su
+# versión coincida con la de 'favorites:<user_id>' en ResourceVersion:
+# - altas y bajas de favoritos: se parchea (o se regenera si estaba desfasado)
+#   en la misma transacción, justo después de incrementar esa versión (Core
+#   aquí arriba; ORM al terminar el flush);
+# - ediciones del catálogo: se incrementa la versión de los usuarios que tienen
+#   la entidad como favorita; hasta su siguiente escritura de favoritos (o
+#   `flask favorites rebuild`) la lectura genera el documento al vuelo;
+# - las lecturas nunca lo guardan: son consultas que pueden ir a una réplica.
+
+def _favorites_version(connection, user_id):
+    return connection.scalar(
+        select(ResourceVersion.version).where(ResourceVersion.key == favorites_version_key(user_id))) or 0
+
+def _documents_statement(kind, user_ids):
+    model, favorite_model, target_column = FAVORITE_KINDS[kind]
+    return (select(favorite_model.user_id, *[getattr(model, name) for name in model.serialize_fields])
+            .join(favorite_model, target_column == model.id)
+            .where(favorite_model.user_id.in_(user_ids))
+            .order_by(favorite_model.user_id, favorite_model.id))
+
+def render_favorites_documents(connection, user_ids):
+    """Genera el documento de cada usuario sin guardarlo; devuelve ({user_id: versión}, {user_id: bytes})."""
+    # La versión se lee antes que los favoritos: si cambian entretanto, el
+    # documento queda con la versión anterior y no se sirve
+    version_keys = {favorites_version_key(user_id): user_id for user_id in user_ids}
+    versions = dict.fromkeys(user_ids, 0)
+    for key, version in connection.execute(
+            select(ResourceVersion.key, ResourceVersion.version).where(ResourceVersion.key.in_(version_keys))):
+        versions[version_keys[key]] = version
+
+    documents = {user_id: {name: [] for name in DOCUMENT_LISTS.values()} for user_id in user_ids}
+    for kind, name in DOCUMENT_LISTS.items():
+        fields = FAVORITE_KINDS[kind][0].serialize_fields
+        for row in connection.execute(_documents_statement(kind, user_ids)):
+            documents[row[0]][name].append(dict(zip(fields, row[1:])))
+    return versions, {user_id: encode_json(document) for user_id, document in documents.items()}
+
+def build_favorites_documents(connection, user_ids):
+    """Genera y guarda el documento de cada usuario; devuelve {user_id: bytes}."""
+    versions, bodies = render_favorites_documents(connection, user_ids)
+    now = _utcnow()
+    stmt = upsert_statement(FavoritesDocument.__table__, connection.dialect.name,
+                            ['version', 'document', 'updated_at'], key=('user_id',))
+    connection.execute(stmt, [{'user_id': user_id, 'version': versions[user_id], 'document': body.decode(),
+                               'updated_at': now} for user_id, body in bodies.items()])
+    return bodies
+
+def favorites_document(connection, user_id):
+    """Bytes JSON de /users/favorites: el documento guardado si está al día y,
+    si no, uno generado al vuelo (sin guardarlo: es una lectura)."""
+    version = select(ResourceVersion.version).where(
+        ResourceVersion.key == favorites_version_key(user_id)).scalar_subquery()
+    document = connection.scalar(select(FavoritesDocument.document).where(
+        FavoritesDocument.user_id == user_id, FavoritesDocument.version == func.coalesce(version, 0)))
+    if document is not None:
+        return document.encode()
+    return render_favorites_documents(connection, [user_id])[1][user_id]
+
+def patch_favorites_document(connection, user_id, changes):
+    """Aplica al documento las altas y bajas {tipo: {entity_id: +1 | -1}}.
+
+    Se llama con la versión de favoritos del usuario ya incrementada en esta
+    transacción: sólo se parchea un documento que estaba al día (versión
+    anterior). Devuelve False si no había documento vigente.
+    """
+    table = FavoritesDocument.__table__
+    version = _favorites_version(connection, user_id)
+    document = connection.scalar(
+        select(table.c.document).where(table.c.user_id == user_id, table.c.version == version - 1))
+    if document is None:
+        return False
+
+    document = decode_json(document)
+    for kind, deltas in changes.items():
+        removed = {entity_id for entity_id, delta in deltas.items() if delta < 0}
+        added = sorted(entity_id for entity_id, delta in deltas.items() if delta > 0)
+        items = [item for item in document[DOCUMENT_LISTS[kind]] if item['id'] not in removed]
+        if added:
+            # Los favoritos nuevos van al final (la lista se ordena por id de favorito)
+            model = FAVORITE_KINDS[kind][0]
+            rows = connection.execute(select(*[getattr(model, name) for name in model.serialize_fields])
+                                      .where(model.id.in_(added)).order_by(model.id))
+            items += [dict(zip(model.serialize_fields, row)) for row in rows]
+        document[DOCUMENT_LISTS[kind]] = items
+
+    connection.execute(update(table)
+                       .where(table.c.user_id == user_id, table.c.version == version - 1)
+                       .values(version=version, document=encode_json(document).decode(), updated_at=_utcnow()))
+    return True
+
+def update_favorites_document(connection, user_id, changes):
+    if not patch_favorites_document(connection, user_id, changes):
+        # No había documento al día: se guarda uno nuevo en esta misma transacción
+        build_favorites_documents(connection, [user_id])
+
+def favorites_catalog_changed(connection, kind, entity_ids):
+    """Deja desfasados los documentos que contienen estas entidades del catálogo."""
+    _, favorite_model, target_column = FAVORITE_KINDS[kind]
+    entity_ids = list(entity_ids)
+    user_ids = set()
+    for start in range(0, len(entity_ids), 500):
+        user_ids.update(connection.scalars(
+            select(favorite_model.user_id).where(target_column.in_(entity_ids[start:start + 500])).distinct()))
+    bump_many_versions(connection, [favorites_version_key(user_id) for user_id in user_ids])
+
+def _schedule_document_patch(target, kind, deltas):
+    session = Session.object_session(target)
+    if session is not None:
+        pending = session.info.setdefault('favorites_document_changes', {}).setdefault(target.user_id, {})
+        for entity_id, delta in deltas.items():
+            kind_deltas = pending.setdefault(kind, {})
+            kind_deltas[entity_id] = kind_deltas.get(entity_id, 0) + delta
+
+# Se registra después del de versions.py (importado antes), así que la versión ya está incrementada
+@event.listens_for(Session, 'after_flush_postexec')
+def _patch_documents_after_flush(session, flush_context):
+    pending = session.info.pop('favorites_document_changes', None)
+    for user_id, changes in (pending or {}).items():
+        update_favorites_document(session.connection(), user_id, changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_document_patches(session):
+    session.info.pop('favorites_document_changes', None)
+
+def _catalog_entity_changed(mapper, connection, target):
+    favorites_catalog_changed(connection, mapper.local_table.name, [target.id])
+
+for _catalog_model in (Character, Planet, Vehicle):
+    event.listen(_catalog_model, 'after_update', _catalog_entity_changed)
+    event.listen(_catalog_model, 'after_delete', _catalog_entity_changed)
+
+
+def parse_popular_limit(args):
+    try:
+        limit = int(args.get('limit') or DEFAULT_POPULAR_LIMIT)
+    except ValueError:
+        raise APIException("'limit' must be an integer", status_code=400)
+    return max(1, min(limit, MAX_POPULAR_LIMIT))
+
+def popular_statement(kind, limit):
+    # Top-N sobre el índice (kind, count, entity_id) y un JOIN por PK para los campos
+    model = FAVORITE_KINDS[kind][0]
+    return (select(*[getattr(model, name) for name in model.serialize_fields], FavoriteCount.count)
+            .join(FavoriteCount, FavoriteCount.entity_id == model.id)
+            .where(FavoriteCount.kind == kind, FavoriteCount.count > 0)
+            .order_by(FavoriteCount.count.desc(), FavoriteCount.entity_id.desc())
+            .limit(limit))
+
+def popular(kind, limit):
+    fields = FAVORITE_KINDS[kind][0].serialize_fields
+    return [{**dict(zip(fields, row)), 'favorites': row[-1]}
+            for row in db.session.execute(popular_statement(kind, limit))]
+
+def reconcile_favorite_counts(kind):
+    """Recalcula los contadores de `kind` a partir de la tabla de favoritos.
+
+    Devuelve cuántas filas corrigió (contadores erróneos + contadores que faltaban).
+    """
+    _, favorite_model, target_column = FAVORITE_KINDS[kind]
+    table = FavoriteCount.__table__
+    actual = (select(func.count())
+              .select_from(favorite_model)
+              .where(target_column == table.c.entity_id)
+              .scalar_subquery())
+    fixed = db.session.execute(
+        update(table).where(table.c.kind == kind, table.c.count != actual).values(count=actual)).rowcount
+
+    counts = (select(literal(kind), target_column, func.count())
+              .where(target_column.is_not(None))
+              .group_by(target_column))
+    missing = insert_ignore_statement(FavoriteCount, db.session.get_bind().dialect.name).from_select(
+        ['kind', 'entity_id', 'count'], counts)
+    fixed += max(db.session.execute(missing).rowcount, 0)
+    return fixed
+
+
+favorites_cli = AppGroup('favorites', help='Favorite counters and documents maintenance.')
+
+@favorites_cli.command('reconcile')
+@click.argument('kinds', nargs=-1, type=click.Choice(list(FAVORITE_KINDS)))
+def reconcile_command(kinds):
+    """Recompute favorite counters from the favorite tables (run periodically)."""
+    for kind in kinds or FAVORITE_KINDS:
+        start = time.perf_counter()
+        fixed = reconcile_favorite_counts(kind)
+        db.session.commit()
+        click.echo(f"{kind}: {fixed} counters fixed in {time.perf_counter() - start:.2f}s")
+
+@favorites_cli.command('rebuild')
+@click.option('--user-id', 'user_ids', multiple=True, type=int, help='Only these users (repeatable)')
+@click.option('--batch-size', default=REBUILD_BATCH_SIZE, show_default=True, help='Users per query/commit')
+def rebuild_command(user_ids, batch_size):
+    """Regenerate the per-user /users/favorites documents (backfill or repair)."""
+    start = time.perf_counter()
+    rebuilt = 0
+    if user_ids:
+        user_ids = sorted(set(user_ids))
+        batches = [user_ids[offset:offset + batch_size] for offset in range(0, len(user_ids), batch_size)]
+    else:
+        batches = _user_id_batches(batch_size)
+    for batch in batches:
+        build_favorites_documents(db.session.connection(), batch)
+        db.session.commit()
+        rebuilt += len(batch)
+    elapsed = time.perf_counter() - start
+    click.echo(f"{rebuilt} documents rebuilt in {elapsed:.2f}s ({rebuilt / elapsed if elapsed else 0:,.0f} users/s)")
+
+def _user_id_batches(batch_size):
+    # Keyset por id: cada lote es una consulta por índice, sin OFFSET
+    last_id = 0
+    while True:
+        batch = list(db.session.scalars(select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)))
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
@@ -0,0 +1,45 @@
+"""Sondas para el balanceador y el orquestador, sin tocar el url map.
+
+- /healthz (liveness): el proceso atiende peticiones. No usa la base de datos.
+- /readyz (readiness): cada engine (primario y réplicas) tiene hueco en su
+  pool y responde a `SELECT 1`. Un pool saturado cuenta como no listo sin
+  esperar a pool_timeout, para que el balanceador deje de mandar tráfico a
+  este worker en vez de encolarlo.
+"""
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from .models import db
+
+
+def _pool_saturated(pool):
+    if not isinstance(pool, QueuePool):
+        return False
+    return pool.checkedout() >= pool.size() + max(pool._max_overflow, 0)
+
+def check_engine(engine):
+    status = {'pool': type(engine.pool).__name__}
+    if isinstance(engine.pool, QueuePool):
+        status['checked_out'] = engine.pool.checkedout()
+        status['size'] = engine.pool.size()
+    if _pool_saturated(engine.pool):
+        status['ready'] = False
+        status['error'] = 'connection pool exhausted'
+        return status
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        status['ready'] = True
+    except Exception as error:
+        status['ready'] = False
+        status['error'] = type(error).__name__
+    return status
+
+def readiness():
+    """(listo, estado por engine)."""
+    engines = {'primary': db.engine}
+    replicas = current_app.extensions.get('db_replicas')
+    for number, engine in enumerate(replicas.engines if replicas is not None else ()):
+        engines[f'replica-{number}'] = engine
+    checks = {name: check_engine(engine) for name, engine in engines.items()}
+    return all(check['ready'] for check in checks.values()), checks
@@ -0,0 +1,288 @@
+"""Carga masiva del catálogo a partir de datos con la forma de SWAPI.
+
+    flask ingest --source https://swapi.dev/api               # people, planets y vehicles
+    flask ingest people planets --source http://localhost:8000/api --workers 16
+    flask ingest people --file dumps/people.json --batch-size 10000
+
+Con --source se piden las páginas (`count`/`next`/`results`) en paralelo con
+un pool de hilos acotado; con --file se lee un volcado local: una lista de
+objetos, una página SWAPI o un dict {"people": [...], "planets": [...]}
+(también JSON Lines si el fichero termina en .jsonl/.ndjson).
+
+Las filas se escriben con INSERT ... ON CONFLICT (id) DO UPDATE en lotes de
+--batch-size, un commit por lote (en Postgres con psycopg2, COPY a una tabla
+temporal y un único INSERT ... SELECT). Son escrituras Core: no disparan los
+eventos de mapper, así que aquí se calculan las columnas *_num y se
+incrementan versiones y generaciones de caché explícitamente.
+"""
+import io
+import json
+import math
+import re
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import click
+import requests
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, text
+from .models import db, Character, Planet, Vehicle
+from .utils import upsert_statement
+from .versions import touch
+from .favorites import favorites_catalog_changed
+from .cache import get_cache
+
+try:
+    import orjson
+except ImportError:  # opcional: acelera la lectura de volcados grandes
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+RESOURCES = {
+    'people': Character,
+    'planets': Planet,
+    'vehicles': Vehicle,
+}
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_WORKERS = 8
+URL_ID_RE = re.compile(r"/(\d+)/?$")
+
+_local = threading.local()
+
+
+def _http():
+    # requests.Session no es seguro entre hilos: una por hilo del pool
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+def fetch_json(url, timeout):
+    response = _http().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def _page_url(url, page):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['page'] = page
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def _bounded_map(pool, fn, items, window):
+    # Como pool.map, pero con como mucho `window` peticiones adelantadas
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def http_pages(url, workers=DEFAULT_WORKERS, timeout=30):
+    """Listas `results` de cada página de un recurso paginado al estilo SWAPI."""
+    first = fetch_json(url, timeout)
+    yield first.get('results') or []
+    next_url = first.get('next')
+    per_page = len(first.get('results') or [])
+    if not next_url:
+        return
+
+    if not first.get('count') or not per_page:
+        # Sin total no se pueden calcular las páginas: seguimos `next` una a una
+        while next_url:
+            page = fetch_json(next_url, timeout)
+            yield page.get('results') or []
+            next_url = page.get('next')
+        return
+
+    urls = [_page_url(next_url, number) for number in range(2, math.ceil(first['count'] / per_page) + 1)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from _bounded_map(pool, lambda page_url: fetch_json(page_url, timeout).get('results') or [],
+                                urls, workers * 2)
+
+def file_pages(path, resource, chunk_size=DEFAULT_BATCH_SIZE):
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path) as dump:
+            chunk = []
+            for line in dump:
+                if line.strip():
+                    chunk.append(loads(line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            yield chunk
+        return
+
+    with open(path, 'rb') as dump:
+        data = loads(dump.read())
+    if isinstance(data, dict):
+        data = data['results'] if 'results' in data else data.get(resource, [])
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+def file_resources(path):
+    if path.endswith(('.jsonl', '.ndjson')):
+        return []
+    with open(path, 'rb') as dump:
+        data = loads(dump.read())
+    return [name for name in RESOURCES if isinstance(data, dict) and name in data]
+
+
+def entity_id(item):
+    """Id de `item`, None si no trae ninguno; ValueError si trae uno no numérico y no hay `url`."""
+    invalid = None
+    for key in ('id', 'uid'):
+        if item.get(key) not in (None, ''):
+            try:
+                return int(item[key])
+            except (TypeError, ValueError):
+                invalid = item[key]
+    # SWAPI no trae id: va al final de `url` (https://swapi.dev/api/people/1/)
+    match = URL_ID_RE.search(item.get('url') or '')
+    if match:
+        return int(match.group(1))
+    if invalid is not None:
+        raise ValueError(f"invalid id {invalid!r}")
+    return None
+
+def _copy_text(value):
+    # Formato text de COPY: \N es NULL; se escapan barra, tabulador y saltos de línea
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+class Ingestion:
+    """Escribe lotes de un modelo con upsert por id y lleva la cuenta de filas."""
+
+    def __init__(self, model):
+        self.model = model
+        table = model.__table__
+        # Longitud de cada columna de texto: los valores se recortan para que quepan
+        self.lengths = {name: table.c[name].type.length for name in model.serialize_fields if name != 'id'}
+        columns = list(self.lengths) + list(model.numeric_fields.values())
+        # Sobre la tabla (no el modelo) para ir por executemany de Core y no por el bulk insert del ORM
+        self.columns = ['id'] + columns
+        self.upsert = upsert_statement(table, db.engine.dialect.name, columns)
+        self.insert = insert(table)
+        self.use_copy = db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2'
+        self.rows = 0
+
+    def row_values(self, item):
+        try:
+            item_id = entity_id(item)
+        except ValueError as e:
+            # Insertarlo sin id duplicaría la fila en cada importación: se descarta
+            current_app.logger.warning("Skipping %s item: %s", self.model.__tablename__, e)
+            return None
+        values = {name: str(item[name])[:length] if item.get(name) is not None else None
+                  for name, length in self.lengths.items()}
+        values.update(self.model.numeric_values(values))
+        values['id'] = item_id
+        return values
+
+    def write(self, batch):
+        # Un id repetido en el mismo lote haría fallar el upsert en Postgres
+        # ("cannot affect row a second time"): gana la última aparición
+        with_id = list({row['id']: row for row in batch if row['id'] is not None}.values())
+        # Sin id (volcados propios) no hay con qué casar: INSERT normal con id autoincremental
+        without_id = [{name: value for name, value in row.items() if name != 'id'}
+                      for row in batch if row['id'] is None]
+        if with_id and self.use_copy:
+            self.copy_upsert(with_id)
+        elif with_id:
+            db.session.execute(self.upsert, with_id)
+        if without_id:
+            self.sync_sequence()
+            db.session.execute(self.insert, without_id)
+        touch(self.model.__tablename__)
+        # Los documentos de favoritos que contienen estas entidades quedan desfasados
+        if with_id:
+            favorites_catalog_changed(db.session.connection(), self.model.__tablename__,
+                                      [row['id'] for row in with_id])
+
+        db.session.commit()
+        # touch() ya cambia la versión que llevan las claves de la caché; esto
+        # renueva además las generaciones de páginas y favoritos
+        cache = get_cache(self.model)
+        if cache is not None:
+            cache.invalidate(self.model)
+        # Sólo las filas escritas: los ids repetidos del lote cuentan una vez
+        self.rows += len(with_id) + len(without_id)
+
+    def copy_upsert(self, rows):
+        table, staging = self.model.__tablename__, f"ingest_{self.model.__tablename__}"
+        columns = ", ".join(self.columns)
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in self.columns[1:])
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_copy_text(row[column]) for column in self.columns) + "\n")
+        buffer.seek(0)
+
+        # El cursor de psycopg2 comparte la transacción de la sesión
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+                           f"(LIKE {table}) ON COMMIT DELETE ROWS")
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN", buffer)
+            cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+                           f"ON CONFLICT (id) DO UPDATE SET {updates}")
+        finally:
+            cursor.close()
+
+    def sync_sequence(self):
+        if db.engine.dialect.name == 'postgresql':
+            # Los ids explícitos no avanzan la secuencia: la ajustamos para los INSERT normales
+            table = self.model.__tablename__
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                    f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+
+    def finish(self):
+        self.sync_sequence()
+        db.session.commit()
+
+def ingest(model, pages, batch_size=DEFAULT_BATCH_SIZE):
+    """Carga las páginas de `pages` en la tabla de `model`; devuelve el número de filas."""
+    ingestion = Ingestion(model)
+    batch = []
+    for results in pages:
+        batch += [values for values in map(ingestion.row_values, results) if values is not None]
+        while len(batch) >= batch_size:
+            ingestion.write(batch[:batch_size])
+            batch = batch[batch_size:]
+    if batch:
+        ingestion.write(batch)
+    ingestion.finish()
+    return ingestion.rows
+
+
+@click.command('ingest')
+@click.argument('resources', nargs=-1, type=click.Choice(list(RESOURCES)))
+@click.option('--source', help='Base URL of a SWAPI-compatible API, e.g. https://swapi.dev/api')
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False), help='Local JSON/JSON Lines dump')
+@click.option('--workers', default=DEFAULT_WORKERS, show_default=True, help='Concurrent page requests')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows per upsert/commit')
+@click.option('--timeout', default=30.0, show_default=True, help='HTTP timeout in seconds')
+@with_appcontext
+def ingest_command(resources, source, path, workers, batch_size, timeout):
+    """Bulk-load people, planets and vehicles from SWAPI-shaped JSON."""
+    if bool(source) == bool(path):
+        raise click.UsageError("Pass exactly one of --source or --file")
+    if path and not resources:
+        resources = file_resources(path)
+        if not resources:
+            raise click.UsageError("Name the resource to load from a list or JSON Lines dump")
+    resources = resources or list(RESOURCES)
+
+    for resource in resources:
+        if source:
+            pages = http_pages(f"{source.rstrip('/')}/{resource}/", workers=workers, timeout=timeout)
+        else:
+            pages = file_pages(path, resource, chunk_size=batch_size)
+        start = time.perf_counter()
+        rows = ingest(RESOURCES[resource], pages, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        click.echo(f"{resource}: {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
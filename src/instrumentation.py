@@ -0,0 +1,220 @@
+"""Instrumentación opcional por endpoint (INSTRUMENTATION_ENABLED=1).
+
+Para cada petición mide el tiempo total, el tiempo en la base de datos y el
+número de sentencias SQL (eventos `before/after_cursor_execute` y
+`handle_error` de todos los engines), el tiempo de serialización JSON y los
+bytes de la respuesta. Se
+publican como histogramas en /metrics y en la cabecera `Server-Timing`
+(visible en las herramientas de desarrollo del navegador).
+
+Muestreo de perfiles: PROFILE_EVERY=N perfila 1 de cada N peticiones y
+PROFILE_SLOW_MS=T guarda el perfil de las que tarden más de T ms (esto obliga
+a perfilar todas las peticiones, con el coste que implica). Los perfiles se
+escriben en PROFILE_DIR: `.prof` de cProfile (`python -m pstats`, snakeviz) o
+`.html` si PROFILER=pyinstrument y el paquete está instalado.
+"""
+import os
+import time
+import cProfile
+import itertools
+from functools import wraps
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .metrics import REGISTRY
+
+try:
+    import pyinstrument
+except ImportError:  # opcional: sin él se usa cProfile
+    pyinstrument = None
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Wall time per request, including streamed bodies',
+    ('endpoint', 'method', 'status'))
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'http_request_db_seconds', 'Time spent executing SQL per request', ('endpoint',))
+REQUEST_SQL_QUERIES = REGISTRY.histogram(
+    'http_request_sql_queries', 'SQL statements executed per request', ('endpoint',), buckets=QUERY_BUCKETS)
+REQUEST_SERIALIZATION = REGISTRY.histogram(
+    'http_request_serialization_seconds', 'Time spent encoding JSON per request', ('endpoint',))
+RESPONSE_SIZE = REGISTRY.histogram(
+    'http_response_size_bytes', 'Response body size', ('endpoint',), buckets=SIZE_BUCKETS)
+
+
+class RequestTiming:
+    __slots__ = ('start', 'db', 'queries', 'serialization', 'serializing', 'profiler')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.serialization = 0.0
+        self.serializing = False
+        self.profiler = None
+
+    def server_timing(self, elapsed):
+        return (f'app;dur={elapsed * 1000:.2f}, '
+                f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", '
+                f'serialize;dur={self.serialization * 1000:.2f}')
+
+
+def current_timing():
+    return g.get('request_timing') if has_request_context() else None
+
+
+# SQL: se registran una sola vez para todos los engines (primario y réplicas)
+_sql_listeners_installed = False
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start'].pop()
+    timing = current_timing()
+    if timing is not None:
+        timing.db += time.perf_counter() - start
+        timing.queries += 1
+
+def _handle_error(exception_context):
+    # Si la sentencia falla no llega after_cursor_execute: se saca aquí su inicio
+    conn = exception_context.connection
+    if conn is None or not conn.info.get('query_start'):
+        return
+    start = conn.info['query_start'].pop()
+    timing = current_timing()
+    if timing is not None:
+        timing.db += time.perf_counter() - start
+        timing.queries += 1
+
+def _install_sql_listeners():
+    global _sql_listeners_installed
+    if not _sql_listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _sql_listeners_installed = True
+
+
+def _timed_serialization(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timing = current_timing()
+        # dumps_bytes puede llamar a dumps: sólo se mide la llamada exterior
+        if timing is None or timing.serializing:
+            return func(*args, **kwargs)
+        timing.serializing = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing.serialization += time.perf_counter() - start
+            timing.serializing = False
+    return wrapper
+
+
+class Profiler:
+    """Perfil de una petición con cProfile o pyinstrument."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            self._profiler = pyinstrument.Profiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def dump(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        if self.kind == 'pyinstrument':
+            path = os.path.join(directory, name + '.html')
+            with open(path, 'w') as output:
+                output.write(self._profiler.output_html())
+        else:
+            path = os.path.join(directory, name + '.prof')
+            self._profiler.dump_stats(path)
+        return path
+
+
+def _record(timing, endpoint, method, status, size):
+    elapsed = time.perf_counter() - timing.start
+    REQUEST_DURATION.observe(elapsed, endpoint, method, status)
+    REQUEST_DB_TIME.observe(timing.db, endpoint)
+    REQUEST_SQL_QUERIES.observe(timing.queries, endpoint)
+    REQUEST_SERIALIZATION.observe(timing.serialization, endpoint)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, endpoint)
+
+def _counted(iterable, on_done):
+    # Cuerpo en streaming: se cuentan los bytes a medida que salen
+    size = 0
+    try:
+        for chunk in iterable:
+            size += len(chunk)
+            yield chunk
+    finally:
+        on_done(size)
+
+
+def init_instrumentation(app):
+    app.config.setdefault('INSTRUMENTATION_ENABLED', os.getenv('INSTRUMENTATION_ENABLED', '0') == '1')
+    app.config.setdefault('PROFILE_EVERY', int(os.getenv('PROFILE_EVERY', 0)))
+    app.config.setdefault('PROFILE_SLOW_MS', float(os.getenv('PROFILE_SLOW_MS', 0)))
+    app.config.setdefault('PROFILE_DIR', os.getenv('PROFILE_DIR', '/tmp/api-profiles'))
+    app.config.setdefault('PROFILER', os.getenv('PROFILER', 'cprofile'))
+    if not app.config['INSTRUMENTATION_ENABLED']:
+        return False
+
+    _install_sql_listeners()
+    app.json.dumps = _timed_serialization(app.json.dumps)
+    app.json.dumps_bytes = _timed_serialization(app.json.dumps_bytes)
+
+    every = app.config['PROFILE_EVERY']
+    slow = app.config['PROFILE_SLOW_MS'] / 1000
+    profiler_kind = 'pyinstrument' if app.config['PROFILER'] == 'pyinstrument' and pyinstrument else 'cprofile'
+    counter = itertools.count(1)
+
+    @app.before_request
+    def start_timing():
+        timing = g.request_timing = RequestTiming()
+        sampled = every > 0 and next(counter) % every == 0
+        if sampled or slow > 0:
+            timing.profiler = Profiler(profiler_kind)
+            g.profile_sampled = sampled
+
+    @app.after_request
+    def finish_timing(response):
+        timing = g.get('request_timing')
+        if timing is None:
+            return response
+        elapsed = time.perf_counter() - timing.start
+        response.headers['Server-Timing'] = timing.server_timing(elapsed)
+
+        endpoint = request.endpoint or 'unmatched'
+        if timing.profiler is not None:
+            timing.profiler.stop()
+            if g.get('profile_sampled') or elapsed >= slow > 0:
+                name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{elapsed * 1000:.0f}ms-{os.getpid()}"
+                timing.profiler.dump(app.config['PROFILE_DIR'], name)
+            timing.profiler = None
+
+        # Las métricas se registran al cerrar la respuesta, con el cuerpo ya enviado
+        method, status = request.method, str(response.status_code)
+        if response.is_streamed:
+            response.response = _counted(response.response,
+                                         lambda size: _record(timing, endpoint, method, status, size))
+        else:
+            response.call_on_close(
+                lambda: _record(timing, endpoint, method, status, response.calculate_content_length()))
+        return response
+
+    return True
@@ -0,0 +1,54 @@
+import json
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el json de la stdlib
+    orjson = None
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Proveedor por defecto de Flask, pero con fechas en ISO 8601 (igual que orjson)
+    y sin reordenar las claves (se respeta el orden de `serialize_fields`)."""
+
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps_bytes(self, obj):
+        return self.dumps(obj).encode()
+
+
+class OrJSONProvider(StdlibJSONProvider):
+    """Codifica con orjson (datetime nativo, salida directa en bytes)."""
+
+    options = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode()
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=StdlibJSONProvider.default, option=self.options)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def dumps_bytes(obj):
+    """Como `app.json.dumps_bytes`, para el código que corre sin app de Flask (modo ASGI)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=StdlibJSONProvider.default, option=OrJSONProvider.options)
+    return json.dumps(obj, default=StdlibJSONProvider.default).encode()
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def init_json(app):
+    app.json_provider_class = OrJSONProvider if orjson else StdlibJSONProvider
+    app.json = app.json_provider_class(app)
@@ -1,8 +1,61 @@
+import math
+from operator import attrgetter
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, Float
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+# Las lecturas de peticiones GET pueden ir a réplicas (ver routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-class User(db.Model):
+class SerializerMixin:
+    # serialize() se genera una sola vez por modelo a partir de serialize_fields
+    serialize_fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if len(cls.serialize_fields) > 1:
+            cls._serialize_values = attrgetter(*cls.serialize_fields)
+
+    def serialize(self):
+        return dict(zip(self.serialize_fields, self._serialize_values(self)))
+
+def parse_number(value):
+    """'1,000' -> 1000, '1.5' -> 1.5; 'unknown', 'n/a', '' o rangos como '30-165' -> None."""
+    if value is None:
+        return None
+    try:
+        number = float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+    if not math.isfinite(number):
+        return None
+    return int(number) if number.is_integer() else number
+
+class FilterableMixin:
+    # Columnas de texto con una columna numérica "sombra" (campo -> columna *_num)
+    # para filtrar por rango y ordenar con índice, y columnas filtrables por igualdad
+    numeric_fields = {}
+    filter_fields = ()
+
+    @classmethod
+    def numeric_values(cls, values):
+        """Valores de las columnas *_num a partir de un dict con los campos de texto."""
+        shadows = {}
+        for field, shadow in cls.numeric_fields.items():
+            number = parse_number(values.get(field))
+            if number is not None and not isinstance(cls.__table__.c[shadow].type, Float):
+                number = round(number)
+            shadows[shadow] = number
+        return shadows
+
+@event.listens_for(FilterableMixin, 'before_insert', propagate=True)
+@event.listens_for(FilterableMixin, 'before_update', propagate=True)
+def _sync_numeric_fields(mapper, connection, target):
+    values = {field: getattr(target, field) for field in target.numeric_fields}
+    for shadow, number in target.numeric_values(values).items():
+        setattr(target, shadow, number)
+
+class User(SerializerMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -12,15 +65,16 @@ class User(db.Model):
     favorite_planets = db.relationship('FavoritePlanet', back_populates='user')
     favorite_vehicles = db.relationship('FavoriteVehicle', back_populates='user')
 
-    def serialize(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'created_at': self.created_at,
-        }
-
-class Character(db.Model):
+    # Columnas públicas (nunca exponer password)
+    serialize_fields = ('id', 'username', 'email', 'created_at')
+
+class Character(FilterableMixin, SerializerMixin, db.Model):
+    __table_args__ = (
+        db.Index('ix_character_height_num_id', 'height_num', 'id'),
+        db.Index('ix_character_name_id', 'name', 'id'),
+        db.Index('ix_character_gender', 'gender'),
+        db.Index('ix_character_eye_color', 'eye_color'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), nullable=False)
     birth_year = db.Column(db.String(20))
@@ -28,39 +82,43 @@ class Character(db.Model):
     height = db.Column(db.String(20))
     skin_color = db.Column(db.String(20))
     eye_color = db.Column(db.String(20))
+    height_num = db.Column(db.Float)
     favorites = db.relationship('FavoriteCharacter', back_populates='character')
 
-    def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'birth_year': self.birth_year,
-            'gender': self.gender,
-            'height': self.height,
-            'skin_color': self.skin_color,
-            'eye_color': self.eye_color,
-        }
-
-class Planet(db.Model):
+    serialize_fields = ('id', 'name', 'birth_year', 'gender', 'height', 'skin_color', 'eye_color')
+    numeric_fields = {'height': 'height_num'}
+    filter_fields = ('gender', 'eye_color')
+
+class Planet(FilterableMixin, SerializerMixin, db.Model):
+    __table_args__ = (
+        db.Index('ix_planet_diameter_num_id', 'diameter_num', 'id'),
+        db.Index('ix_planet_population_num_id', 'population_num', 'id'),
+        db.Index('ix_planet_name_id', 'name', 'id'),
+        db.Index('ix_planet_climate', 'climate'),
+        db.Index('ix_planet_terrain', 'terrain'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), nullable=False)
     climate = db.Column(db.String(50))
     diameter = db.Column(db.String(50))
     population = db.Column(db.String(50))
     terrain = db.Column(db.String(50))
+    diameter_num = db.Column(db.BigInteger)
+    population_num = db.Column(db.BigInteger)
     favorites = db.relationship('FavoritePlanet', back_populates='planet')
 
-    def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'climate': self.climate,
-            'diameter': self.diameter,
-            'population': self.population,
-            'terrain': self.terrain,
-        }
-
-class Vehicle(db.Model):
+    serialize_fields = ('id', 'name', 'climate', 'diameter', 'population', 'terrain')
+    numeric_fields = {'diameter': 'diameter_num', 'population': 'population_num'}
+    filter_fields = ('climate', 'terrain')
+
+class Vehicle(FilterableMixin, SerializerMixin, db.Model):
+    __table_args__ = (
+        db.Index('ix_vehicle_cost_in_credits_num_id', 'cost_in_credits_num', 'id'),
+        db.Index('ix_vehicle_passengers_num_id', 'passengers_num', 'id'),
+        db.Index('ix_vehicle_name_id', 'name', 'id'),
+        db.Index('ix_vehicle_vehicle_class', 'vehicle_class'),
+        db.Index('ix_vehicle_manufacturer', 'manufacturer'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), nullable=False)
     model = db.Column(db.String(50))
@@ -68,20 +126,19 @@ class Vehicle(db.Model):
     cost_in_credits = db.Column(db.String(50))
     passengers = db.Column(db.String(50))
     vehicle_class = db.Column(db.String(50))
+    cost_in_credits_num = db.Column(db.BigInteger)
+    passengers_num = db.Column(db.BigInteger)
     favorites = db.relationship('FavoriteVehicle', back_populates='vehicle')
 
-    def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'model': self.model,
-            'manufacturer': self.manufacturer,
-            'cost_in_credits': self.cost_in_credits,
-            'passengers': self.passengers,
-            'vehicle_class': self.vehicle_class,
-        }
+    serialize_fields = ('id', 'name', 'model', 'manufacturer', 'cost_in_credits', 'passengers', 'vehicle_class')
+    numeric_fields = {'cost_in_credits': 'cost_in_credits_num', 'passengers': 'passengers_num'}
+    filter_fields = ('vehicle_class', 'manufacturer')
 
 class FavoriteCharacter(db.Model):
+    __table_args__ = (
+        db.Index('ix_favorite_character_user_id_character_id', 'user_id', 'character_id', unique=True),
+        db.Index('ix_favorite_character_character_id', 'character_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     character_id = db.Column(db.Integer, db.ForeignKey('character.id'), nullable=False)
@@ -89,6 +146,10 @@ class FavoriteCharacter(db.Model):
     character = db.relationship('Character', back_populates='favorites')
 
 class FavoritePlanet(db.Model):
+    __table_args__ = (
+        db.Index('ix_favorite_planet_user_id_planet_id', 'user_id', 'planet_id', unique=True),
+        db.Index('ix_favorite_planet_planet_id', 'planet_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'), nullable=False)
@@ -96,8 +157,37 @@ class FavoritePlanet(db.Model):
     planet = db.relationship('Planet', back_populates='favorites')
 
 class FavoriteVehicle(db.Model):
+    __table_args__ = (
+        db.Index('ix_favorite_vehicle_user_id_vehicle_id', 'user_id', 'vehicle_id', unique=True),
+        db.Index('ix_favorite_vehicle_vehicle_id', 'vehicle_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     user = db.relationship('User', back_populates='favorite_vehicles')
-    vehicle = db.relationship('Vehicle', back_populates='favorites')
\ No newline at end of file
+    vehicle = db.relationship('Vehicle', back_populates='favorites')
+
+class FavoriteCount(db.Model):
+    # Nº de usuarios que marcaron cada entidad como favorita, mantenido al añadir/quitar favoritos
+    __table_args__ = (
+        db.Index('ix_favorite_count_kind_count_entity_id', 'kind', 'count', 'entity_id'),
+    )
+    kind = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class FavoritesDocument(db.Model):
+    # Respuesta de /users/favorites ya serializada por usuario; vale mientras
+    # `version` coincida con la de ResourceVersion 'favorites:<user_id>'
+    __tablename__ = 'favorites_document'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    # En MySQL TEXT(n) pasa a MEDIUMTEXT (TEXT se queda en 64 KB)
+    document = db.Column(db.Text().with_variant(db.Text(16777215), 'mysql', 'mariadb'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class ResourceVersion(db.Model):
+    # Contador de versión por recurso ('character', 'favorites:1', ...) para ETag/Last-Modified
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,83 @@
+"""Multi-get del catálogo: muchas entidades por id en una sola petición.
+
+    GET /people?ids=1,2,3        (también /planets y /vehicles)
+    POST /batch {"items": [{"type": "character", "id": 1}, {"type": "planet", "id": 3}]}
+
+Una consulta `IN (...)` por tipo, sólo para los ids que no estén ya en la
+caché de entidades; los cuerpos cacheados se reutilizan tal cual (son los
+mismos bytes que devuelve /people/<id>). La respuesta conserva el orden pedido
+e informa de cada elemento:
+
+    {"results": [{"type": "character", "id": 1, "status": "found", "data": {...}},
+                 {"type": "planet", "id": 99, "status": "not_found"}]}
+"""
+from .models import Character, Planet, Vehicle
+from .utils import APIException
+from .cache import get_entities_json, json_response, encode_json
+
+ENTITY_KINDS = {
+    'character': Character,
+    'planet': Planet,
+    'vehicle': Vehicle,
+}
+MAX_MULTIGET_SIZE = 500
+
+
+def parse_ids(value):
+    """Valida `ids=1,2,3`; devuelve la lista de enteros en el orden recibido."""
+    parts = [part.strip() for part in value.split(',') if part.strip()]
+    if not parts or not all(part.isdigit() for part in parts):
+        raise APIException("'ids' must be a comma-separated list of integers", status_code=400)
+    if len(parts) > MAX_MULTIGET_SIZE:
+        raise APIException(f"At most {MAX_MULTIGET_SIZE} ids per request", status_code=400)
+    return [int(part) for part in parts]
+
+def parse_multiget(data):
+    """Valida el cuerpo {"items": [{"type": "planet", "id": 3}, ...]}.
+
+    Devuelve la lista de (tipo, id, válido) en el orden recibido.
+    """
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise APIException("'items' must be a non-empty list of {type, id} objects", status_code=400)
+    if len(items) > MAX_MULTIGET_SIZE:
+        raise APIException(f"At most {MAX_MULTIGET_SIZE} items per batch", status_code=400)
+
+    parsed = []
+    for item in items:
+        kind = item.get('type') if isinstance(item, dict) else None
+        entity_id = item.get('id') if isinstance(item, dict) else None
+        valid = kind in ENTITY_KINDS and isinstance(entity_id, int) and not isinstance(entity_id, bool)
+        parsed.append((kind, entity_id, valid))
+    return parsed
+
+
+def multiget_ids(parsed):
+    """{tipo: ids ordenados} de los elementos válidos."""
+    grouped = {}
+    for kind, entity_id, valid in parsed:
+        if valid:
+            grouped.setdefault(kind, set()).add(entity_id)
+    return {kind: sorted(ids) for kind, ids in grouped.items()}
+
+def multiget_body(parsed, bodies):
+    """Bytes JSON de {"results": [...]}; `bodies` es {tipo: {id: bytes JSON}}."""
+    # Los cuerpos de las entidades ya son JSON: se insertan sin decodificarlos
+    results = []
+    for kind, entity_id, valid in parsed:
+        body = bodies[kind].get(entity_id) if valid else None
+        if body is None:
+            status = 'not_found' if valid else 'invalid'
+            results.append(encode_json({'type': kind, 'id': entity_id, 'status': status}).rstrip())
+        else:
+            header = encode_json({'type': kind, 'id': entity_id, 'status': 'found'}).rstrip()
+            results.append(header[:-1] + b',"data":' + body.rstrip() + b'}')
+    return b'{"results":[' + b','.join(results) + b']}\n'
+
+def multiget_json(parsed):
+    """Bytes JSON de {"results": [...]} para la lista de (tipo, id, válido)."""
+    bodies = {kind: get_entities_json(ENTITY_KINDS[kind], ids) for kind, ids in multiget_ids(parsed).items()}
+    return multiget_body(parsed, bodies)
+
+def multiget_response(kind, ids):
+    return json_response(multiget_json([(kind, entity_id, True) for entity_id in parse_ids(ids)]))
@@ -0,0 +1,258 @@
+import json
+import base64
+import operator
+from collections import namedtuple
+from flask import request, url_for, Response, stream_with_context
+from sqlalchemy import select, tuple_
+from .utils import APIException
+from .models import db
+from .cache import get_cache, encode_json, json_response, table_version
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Parámetros que no son filtros; los que empiezan por '_' se ignoran (cache busters)
+RESERVED_ARGS = ('limit', 'after', 'fields', 'sort', 'stream', 'format')
+RANGE_OPERATORS = {'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+
+# param es el valor de ?sort= ('id', '-diameter', ...); column la columna ordenada
+SortSpec = namedtuple('SortSpec', 'param column descending nullable')
+ListQuery = namedtuple('ListQuery', 'fields limit after filters sort applied')
+
+def _int_arg(args, name, default, minimum):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise APIException(f"'{name}' must be an integer", status_code=400)
+    if value < minimum:
+        raise APIException(f"'{name}' must be >= {minimum}", status_code=400)
+    return value
+
+def _number_arg(name, raw):
+    try:
+        return float(raw)
+    except ValueError:
+        raise APIException(f"'{name}' must be a number", status_code=400)
+
+def parse_fields(model, args):
+    allowed = model.serialize_fields
+    raw = args.get('fields')
+    if not raw:
+        return list(allowed)
+
+    requested = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise APIException("Unknown field(s): " + ", ".join(unknown), status_code=400,
+                           payload={'allowed_fields': list(allowed)})
+    # Siempre incluimos el id: es la clave del cursor
+    return ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+def allowed_filters(model):
+    numeric = getattr(model, 'numeric_fields', {})
+    ranges = [f"{field}_{op}" for field in numeric for op in RANGE_OPERATORS]
+    return list(getattr(model, 'filter_fields', ())) + list(numeric) + ranges
+
+def parse_filters(model, args):
+    """Convierte ?climate=arid, ?population_gt=1000... en condiciones SQL.
+
+    Los campos numéricos se comparan contra su columna *_num (indexada).
+    Devuelve las condiciones y su forma canónica para la clave de caché.
+    """
+    numeric = getattr(model, 'numeric_fields', {})
+    filter_fields = getattr(model, 'filter_fields', ())
+    conditions, applied = [], []
+    for name in sorted(args.keys()):
+        if name in RESERVED_ARGS or name.startswith('_'):
+            continue
+        value = args.get(name)
+        field, _, op = name.rpartition('_')
+        if name in numeric:
+            condition = getattr(model, numeric[name]) == _number_arg(name, value)
+        elif field in numeric and op in RANGE_OPERATORS:
+            condition = RANGE_OPERATORS[op](getattr(model, numeric[field]), _number_arg(name, value))
+        elif name in filter_fields:
+            condition = getattr(model, name) == value
+        else:
+            raise APIException(f"Unknown filter '{name}'", status_code=400,
+                               payload={'allowed_filters': allowed_filters(model)})
+        conditions.append(condition)
+        applied.append(f"{name}={value}")
+    return conditions, applied
+
+def sortable_columns(model):
+    # id siempre; name sólo en los modelos que tienen esa columna (User no)
+    return [name for name in ('id', 'name') if name in model.__table__.c]
+
+def parse_sort(model, args):
+    param = args.get('sort') or 'id'
+    name = param[1:] if param.startswith('-') else param
+    numeric = getattr(model, 'numeric_fields', {})
+    if name in numeric:
+        column = getattr(model, numeric[name])
+    elif name in sortable_columns(model):
+        column = getattr(model, name)
+    else:
+        raise APIException(f"Cannot sort by '{name}'", status_code=400,
+                           payload={'allowed_sort': [*sortable_columns(model), *numeric]})
+    return SortSpec(param, column, param.startswith('-'), model.__table__.c[column.key].nullable)
+
+def encode_cursor(sort, row):
+    # Las filas llevan al final (clave de orden, id); ordenando por id basta un entero
+    if sort.column.key == 'id':
+        return row[-1]
+    payload = json.dumps([sort.param, row[-2], row[-1]], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+def parse_cursor(args, sort):
+    if sort.column.key == 'id':
+        return _int_arg(args, 'after', 0, 0)
+    raw = args.get('after')
+    if not raw:
+        return None
+    try:
+        param, value, last_id = json.loads(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+        valid = param == sort.param and isinstance(last_id, int)
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise APIException("'after' is not a valid cursor for this sort", status_code=400)
+    return value, last_id
+
+def parse_list_args(model, args):
+    limit = min(_int_arg(args, 'limit', DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    sort = parse_sort(model, args)
+    filters, applied = parse_filters(model, args)
+    return ListQuery(parse_fields(model, args), limit, parse_cursor(args, sort), filters, sort, applied)
+
+def list_statements(model, query):
+    """Sentencias keyset de ?sort= y filtros, a ejecutar en orden.
+
+    Cada fila lleva al final (clave de orden, id) para construir el cursor.
+    Ordenando por una columna que admite NULL hay dos fases, ambas sobre
+    índices (columna, id): primero las filas con valor en el orden pedido y
+    después las NULL por id. El cursor (None, id) indica la segunda fase.
+    """
+    sort, after = query.sort, query.after
+    columns = [getattr(model, name) for name in query.fields] + [sort.column, model.id]
+
+    if sort.column.key == 'id':
+        stmt = select(*columns).where(*query.filters)
+        if not sort.descending:
+            return [stmt.where(model.id > after).order_by(model.id)]
+        if after:
+            stmt = stmt.where(model.id < after)
+        return [stmt.order_by(model.id.desc())]
+
+    statements = []
+    if after is None or after[0] is not None:
+        stmt = select(*columns).where(*query.filters)
+        if sort.nullable:
+            stmt = stmt.where(sort.column.is_not(None))
+        key = tuple_(sort.column, model.id)
+        if sort.descending:
+            stmt = stmt.order_by(sort.column.desc(), model.id.desc())
+            if after is not None:
+                stmt = stmt.where(key < tuple_(*after))
+        else:
+            stmt = stmt.order_by(sort.column, model.id)
+            if after is not None:
+                stmt = stmt.where(key > tuple_(*after))
+        statements.append(stmt)
+    if sort.nullable:
+        stmt = select(*columns).where(*query.filters, sort.column.is_(None)).order_by(model.id)
+        if after is not None and after[0] is None:
+            stmt = stmt.where(model.id > after[1])
+        statements.append(stmt)
+    return statements
+
+def fetch_list_rows(execute, model, query):
+    """Filas de la página (hasta limit + 1); `execute` recibe una sentencia y devuelve sus filas."""
+    # Pedimos una fila extra para saber si hay página siguiente
+    rows = []
+    for stmt in list_statements(model, query):
+        rows += execute(stmt.limit(query.limit + 1 - len(rows)))
+        if len(rows) > query.limit:
+            break
+    return rows
+
+def fetch_page(model, query):
+    rows = fetch_list_rows(lambda stmt: db.session.execute(stmt).all(), model, query)
+
+    next_after = encode_cursor(query.sort, rows[query.limit - 1]) if len(rows) > query.limit else None
+    items = [dict(zip(query.fields, row)) for row in rows[:query.limit]]
+    return items, next_after
+
+def next_page_url(next_after):
+    args = request.args.to_dict()
+    args['after'] = next_after
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def _stream_rows(model, query):
+    # Cursor del lado del servidor: yield_per evita cargar la tabla completa
+    for stmt in list_statements(model, query):
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for batch in result.partitions():
+            yield [dict(zip(query.fields, row)) for row in batch]
+
+# Un lote de filas en cada formato de streaming (también los usa el modo ASGI)
+def ndjson_chunk(batch):
+    return b"".join(encode_json(item) for item in batch)
+
+def json_array_chunk(batch):
+    return b",".join(encode_json(item)[:-1] for item in batch)
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        yield ndjson_chunk(batch)
+
+def _json_array_chunks(batches):
+    yield b"["
+    separator = b""
+    for batch in batches:
+        yield separator + json_array_chunk(batch)
+        separator = b","
+    yield b"]"
+
+def streaming_response(model):
+    batches = _stream_rows(model, parse_list_args(model, request.args))
+
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE or request.args.get('format') == 'ndjson':
+        body, mimetype = _ndjson_chunks(batches), NDJSON_MIMETYPE
+    else:
+        body, mimetype = _json_array_chunks(batches), 'application/json'
+    return Response(stream_with_context(body), mimetype=mimetype), 200
+
+def paginated_response(model):
+    if wants_stream():
+        return streaming_response(model)
+
+    query = parse_list_args(model, request.args)
+
+    def render():
+        items, next_after = fetch_page(model, query)
+        return encode_json(items), next_after
+
+    cache = get_cache(model)
+    if cache is None:
+        body, next_after = render()
+    else:
+        key = cache.page_key(model, table_version(model), query.after, query.limit, ",".join(query.fields),
+                             query.sort.param, "&".join(query.applied))
+        body, next_after = cache.get_or_set(key, render)
+
+    response = json_response(body)
+    if next_after is not None:
+        response.headers['Link'] = f'<{next_page_url(next_after)}>; rel="next"'
+        response.headers['X-Next-Cursor'] = str(next_after)
+    return response, 200
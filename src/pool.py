@@ -0,0 +1,113 @@
+import os
+import time
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from .metrics import REGISTRY
+
+POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', ('engine',))
+POOL_CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up after pool_timeout', ('engine',))
+
+# Pools vivos de este proceso, por nombre de engine ('primary', 'replica-0', ...)
+_pools = {}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout (incluye abrir conexiones nuevas)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_name = self.logging_name or 'primary'
+        _pools[self.metrics_name] = self
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(self.metrics_name)
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, self.metrics_name)
+
+    def recreate(self):
+        pool = super().recreate()
+        _pools[self.metrics_name] = pool
+        return pool
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(uri, name='primary'):
+    """Opciones de create_engine leídas de variables de entorno DB_*."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # SQLite en memoria usa su propio pool de una sola conexión
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_logging_name': name,
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout:
+        backend = url.get_backend_name()
+        if backend == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+        elif backend in ('mysql', 'mariadb'):
+            options['connect_args'] = {'init_command': f'SET SESSION MAX_EXECUTION_TIME={statement_timeout}'}
+    return options
+
+
+def _pool_samples():
+    size, checked_out, overflow, utilization = [], [], [], []
+    for name, pool in sorted(_pools.items()):
+        labels = {'engine': name}
+        size.append((labels, pool.size()))
+        checked_out.append((labels, pool.checkedout()))
+        overflow.append((labels, max(pool.overflow(), 0)))
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        utilization.append((labels, round(pool.checkedout() / capacity, 4) if capacity else 0))
+    return [
+        ('db_pool_size', 'Configured pool size', 'gauge', size),
+        ('db_pool_checked_out', 'Connections currently checked out', 'gauge', checked_out),
+        ('db_pool_overflow', 'Overflow connections currently open', 'gauge', overflow),
+        ('db_pool_utilization', 'Checked out connections / (pool_size + max_overflow)', 'gauge', utilization),
+    ]
+
+REGISTRY.add_collector(_pool_samples)
+
+
+def dispose_after_fork(engines):
+    """Descarta los pools heredados en cada proceso hijo.
+
+    gunicorn importa la app en el master si se usa --preload; los hijos
+    heredarían sockets abiertos. dispose(close=False) abandona esas conexiones
+    sin cerrarlas (siguen siendo del padre) y el hijo abre las suyas.
+    """
+    def dispose_in_child():
+        for engine in engines:
+            engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=dispose_in_child)
+
+def init_pool(app, db):
+    # Después de db.init_app, cuando los engines ya existen
+    with app.app_context():
+        dispose_after_fork(list(db.engines.values()))
@@ -0,0 +1,383 @@
+"""Límites de peticiones y control de admisión (RATELIMIT_ENABLED=1).
+
+Cada ruta pertenece a una clase (decorador `route_class`; sin él, `lookup`
+para GET y `write` para el resto):
+- lookup: búsquedas puntuales (/people/<id>...), baratas.
+- list: listados y búsquedas (/people, /users, /search, /batch).
+- export: un listado pedido en streaming (?stream=1 o NDJSON): recorre la tabla entera.
+- write: altas y bajas.
+
+Dos controles, en este orden:
+1. Token bucket por cliente y clase (RATE_LIMITS, `clase=tokens_por_segundo:ráfaga`).
+   Sin tokens: 429 con Retry-After (lo que falta para el siguiente token).
+2. Tope de peticiones simultáneas por clase para todos los clientes
+   (CONCURRENCY_LIMITS, `clase=n`). Con el tope lleno la petición espera un hueco
+   hasta CONCURRENCY_QUEUE_TIMEOUT segundos y después responde 503 con Retry-After.
+   Con topes en list/export por debajo del número de workers siempre quedan
+   workers libres para las búsquedas puntuales aunque alguien lance una exportación.
+
+El estado vive en RATELIMIT_STORAGE: memory (por proceso; en workers sync el
+tope de concurrencia no protege nada), sqlite (fichero compartido por los
+workers de la máquina) o redis (compartido entre máquinas). El cliente es la
+IP remota; detrás de un proxy, RATELIMIT_PROXY_HOPS indica cuántas entradas de
+X-Forwarded-For añaden los proxies de confianza.
+"""
+import os
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from flask import g, request, jsonify
+from .metrics import REGISTRY
+from .pagination import wants_stream
+
+DEFAULT_RATE_LIMITS = 'lookup=50:100,list=10:20,export=0.2:2,write=10:20'
+DEFAULT_CONCURRENCY_LIMITS = 'list=4,export=1'
+# Un slot de concurrencia caduca solo si el worker muere sin liberarlo
+SLOT_TTL = 600
+
+REJECTED = REGISTRY.counter(
+    'http_requests_rejected_total', 'Requests rejected by rate limits (429) or concurrency caps (503)',
+    ('route_class', 'reason'))
+QUEUED = REGISTRY.counter(
+    'http_requests_queued_total', 'Requests that waited for a concurrency slot', ('route_class',))
+
+
+def route_class(name):
+    """Asigna la clase de límites de una vista; None la deja sin límites."""
+    def decorator(view):
+        view.route_class = name
+        return view
+    return decorator
+
+
+class LimiterStore:
+    """Interfaz común de los almacenes de estado de los límites.
+
+    `take` consume `cost` tokens del bucket `key` (se rellena a `rate` tokens por
+    segundo hasta `burst`) y devuelve 0 si había tokens o los segundos que faltan
+    para tenerlos. `acquire` ocupa un slot de `key` si hay menos de `limit`
+    ocupados y devuelve su identificador (o None); `release` lo libera.
+    """
+
+    def take(self, key, rate, burst, cost=1):
+        raise NotImplementedError()
+
+    def acquire(self, key, limit):
+        raise NotImplementedError()
+
+    def release(self, key, slot):
+        raise NotImplementedError()
+
+
+def _refill(tokens, updated_at, now, rate, burst):
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+class MemoryLimiterStore(LimiterStore):
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (burst, now, now))
+            tokens = _refill(tokens, updated_at, now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                self._trim(now)
+            return wait
+
+    def _trim(self, now):
+        # Un bucket que ya estaría lleno es igual que uno que no existe
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at < now]:
+            del self._buckets[key]
+
+    def acquire(self, key, limit):
+        now = time.monotonic()
+        with self._lock:
+            # slot -> caducidad, como en SQLite y Redis
+            slots = self._slots.setdefault(key, {})
+            for expired in [slot for slot, expires_at in slots.items() if expires_at < now]:
+                del slots[expired]
+            if len(slots) >= limit:
+                return None
+            slot = uuid.uuid4().hex
+            slots[slot] = now + SLOT_TTL
+            return slot
+
+    def release(self, key, slot):
+        with self._lock:
+            self._slots.get(key, {}).pop(slot, None)
+
+
+class SQLiteLimiterStore(LimiterStore):
+    """Estado compartido por los workers de la máquina sobre un fichero SQLite (modo WAL)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS ratelimit_bucket ("
+                     "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS ratelimit_slot ("
+                     "slot TEXT PRIMARY KEY, key TEXT NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_ratelimit_slot_key ON ratelimit_slot (key)")
+
+    def _connection(self):
+        # Una conexión por hilo y por proceso: nunca se reutiliza tras un fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        conn = self._connection()
+        # BEGIN IMMEDIATE: leer y escribir el bucket sin que otro worker se cuele en medio
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM ratelimit_bucket WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, rate, burst) if row else burst
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO ratelimit_bucket (key, tokens, updated_at, full_at) "
+                         "VALUES (?, ?, ?, ?)", (key, tokens, now, now + (burst - tokens) / rate))
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                conn.execute("DELETE FROM ratelimit_bucket WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, key, limit):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM ratelimit_slot WHERE key = ? AND expires_at < ?", (key, now))
+            slot = None
+            if conn.execute("SELECT COUNT(*) FROM ratelimit_slot WHERE key = ?", (key,)).fetchone()[0] < limit:
+                slot = uuid.uuid4().hex
+                conn.execute("INSERT INTO ratelimit_slot (slot, key, expires_at) VALUES (?, ?, ?)",
+                             (slot, key, now + SLOT_TTL))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return slot
+
+    def release(self, key, slot):
+        self._connection().execute("DELETE FROM ratelimit_slot WHERE slot = ?", (slot,))
+
+
+# Scripts atómicos en el servidor; el reloj es el de Redis (TIME), común a todas las máquinas
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = burst
+if state[1] then
+    tokens = math.min(burst, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then return 0 end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[2])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+
+class RedisLimiterStore(LimiterStore):
+    """Estado compartido entre máquinas sobre Redis (requiere el paquete `redis`)."""
+
+    def __init__(self, url, prefix='api-ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATELIMIT_STORAGE=redis requires the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._take(keys=[self.prefix + 'bucket:' + key], args=[rate, burst, cost]))
+
+    def acquire(self, key, limit):
+        slot = uuid.uuid4().hex
+        if self._acquire(keys=[self.prefix + 'slots:' + key], args=[limit, slot, SLOT_TTL]):
+            return slot
+        return None
+
+    def release(self, key, slot):
+        self.client.zrem(self.prefix + 'slots:' + key, slot)
+
+
+def create_store(config):
+    kind = config['RATELIMIT_STORAGE']
+    if kind == 'memory':
+        return MemoryLimiterStore()
+    if kind == 'sqlite':
+        return SQLiteLimiterStore(config['RATELIMIT_STORAGE_URL'] or '/tmp/api-ratelimit.db')
+    if kind == 'redis':
+        return RedisLimiterStore(config['RATELIMIT_STORAGE_URL'] or 'redis://localhost:6379/0')
+    raise ValueError(f"Unknown RATELIMIT_STORAGE: {kind}")
+
+
+def parse_limits(value, parts):
+    """`clase=a:b,clase=c` -> {clase: (a, b)} con `parts` números por clase."""
+    limits = {}
+    for item in filter(None, (item.strip() for item in value.split(','))):
+        name, _, numbers = item.partition('=')
+        numbers = numbers.split(':')
+        if len(numbers) != parts:
+            raise ValueError(f"Invalid limit {item!r}; expected class={':'.join(['n'] * parts)}")
+        try:
+            numbers = tuple(float(number) for number in numbers)
+        except ValueError:
+            raise ValueError(f"Invalid limit {item!r}; expected numbers") from None
+        # Una tasa de 0 dividiría por cero al calcular la espera
+        if not all(number > 0 for number in numbers):
+            raise ValueError(f"Invalid limit {item!r}; values must be positive")
+        limits[name.strip()] = numbers
+    return limits
+
+
+def client_id(hops=0):
+    if hops:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr or 'unknown'
+
+def request_class(app):
+    if request.method == 'OPTIONS':
+        return None
+    view = app.view_functions.get(request.endpoint)
+    name = getattr(view, 'route_class', 'default')
+    if name == 'default':
+        return 'lookup' if request.method in ('GET', 'HEAD') else 'write'
+    if name == 'list' and wants_stream():
+        return 'export'
+    return name
+
+
+class Limits:
+    def __init__(self, store, rates, concurrency, queue_timeout, proxy_hops):
+        self.store = store
+        self.rates = rates
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.proxy_hops = proxy_hops
+
+    def acquire_slot(self, name):
+        """Identificador del slot, esperando hasta `queue_timeout`; None si no hay hueco."""
+        limit = self.concurrency[name]
+        slot = self.store.acquire(name, limit)
+        if slot is not None:
+            return slot
+        QUEUED.inc(name)
+        deadline = time.monotonic() + self.queue_timeout
+        delay = 0.005
+        while slot is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+            slot = self.store.acquire(name, limit)
+        return slot
+
+
+def _rejection(message, status, retry_after):
+    response = jsonify({"message": message, "status_code": status})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def _release_slot(store, name, slot):
+    def release():
+        store.release(name, slot)
+    return release
+
+
+def init_rate_limits(app):
+    app.config.setdefault('RATELIMIT_ENABLED', os.getenv('RATELIMIT_ENABLED', '0') == '1')
+    # memory (por proceso) | sqlite (fichero compartido entre workers) | redis
+    app.config.setdefault('RATELIMIT_STORAGE', os.getenv('RATELIMIT_STORAGE', 'memory'))
+    app.config.setdefault('RATELIMIT_STORAGE_URL', os.getenv('RATELIMIT_STORAGE_URL'))
+    app.config.setdefault('RATE_LIMITS', os.getenv('RATE_LIMITS', DEFAULT_RATE_LIMITS))
+    app.config.setdefault('CONCURRENCY_LIMITS', os.getenv('CONCURRENCY_LIMITS', DEFAULT_CONCURRENCY_LIMITS))
+    app.config.setdefault('CONCURRENCY_QUEUE_TIMEOUT', float(os.getenv('CONCURRENCY_QUEUE_TIMEOUT', 0.5)))
+    app.config.setdefault('RATELIMIT_PROXY_HOPS', int(os.getenv('RATELIMIT_PROXY_HOPS', 0)))
+    if not app.config['RATELIMIT_ENABLED']:
+        return None
+
+    concurrency = {name: int(limit) for name, (limit,) in parse_limits(app.config['CONCURRENCY_LIMITS'], 1).items()}
+    limits = Limits(create_store(app.config), parse_limits(app.config['RATE_LIMITS'], 2), concurrency,
+                    app.config['CONCURRENCY_QUEUE_TIMEOUT'], app.config['RATELIMIT_PROXY_HOPS'])
+    app.extensions['rate_limits'] = limits
+
+    @app.before_request
+    def admit_request():
+        name = request_class(app)
+        if name is None:
+            return None
+        if name in limits.rates:
+            rate, burst = limits.rates[name]
+            wait = limits.store.take(f"{name}:{client_id(limits.proxy_hops)}", rate, burst)
+            if wait:
+                REJECTED.inc(name, 'rate')
+                return _rejection("Too many requests, slow down", 429, wait)
+        if name in limits.concurrency:
+            slot = limits.acquire_slot(name)
+            if slot is None:
+                REJECTED.inc(name, 'concurrency')
+                return _rejection("Server busy, retry later", 503, 1)
+            g.admission_slot = (name, slot)
+        return None
+
+    @app.after_request
+    def hold_slot_while_streaming(response):
+        # El slot se libera cuando el servidor cierra la respuesta (al final del streaming)
+        held = g.pop('admission_slot', None)
+        if held is not None:
+            response.call_on_close(_release_slot(limits.store, *held))
+        return response
+
+    @app.teardown_request
+    def release_slot(exc):
+        # Si no se llegó a construir la respuesta (error no controlado)
+        held = g.pop('admission_slot', None)
+        if held is not None:
+            limits.store.release(*held)
+
+    return limits
@@ -0,0 +1,124 @@
+import os
+import time
+import itertools
+import threading
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from .metrics import REGISTRY
+from .pool import engine_options, dispose_after_fork
+from .utils import get_current_user_id
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+DB_ROUTED_SESSIONS = REGISTRY.counter(
+    'db_routed_sessions_total', 'Sessions routed to each engine', ('engine',))
+
+
+class ReplicaSet:
+    """Engines de réplica con selección round-robin o por menos conexiones."""
+
+    def __init__(self, engines, strategy='round_robin'):
+        self.engines = engines
+        self.strategy = strategy
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def choose(self):
+        if self.strategy == 'least_connections':
+            return min(self.engines, key=lambda engine: engine.pool.checkedout())
+        with self._lock:
+            return self.engines[next(self._counter) % len(self.engines)]
+
+
+class RoutingSession(Session):
+    """Sesión que envía las lecturas de las peticiones de sólo lectura a una réplica.
+
+    Todo lo demás va al primario: escrituras (flush o INSERT/UPDATE/DELETE
+    explícitos), rutas de Flask-Admin, peticiones que no son GET y usuarios
+    dentro de su ventana de read-your-writes. Una vez que la sesión escribe,
+    se queda en el primario; la réplica elegida se mantiene durante toda la
+    sesión para no abrir una conexión por consulta.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return primary
+
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+        if self.info.get('wrote') or not _read_only_request():
+            return primary
+
+        replica = self.info.get('replica')
+        if replica is None:
+            replicas = current_app.extensions.get('db_replicas')
+            if replicas is None:
+                return primary
+            replica = self.info['replica'] = replicas.choose()
+            DB_ROUTED_SESSIONS.inc(replica.pool.logging_name or 'replica')
+        return replica
+
+
+def _read_only_request():
+    if not has_request_context():
+        return False
+    route = g.get('db_route')
+    if route is None:
+        route = g.db_route = 'replica' if _can_use_replica() else 'primary'
+    return route == 'replica'
+
+def _can_use_replica():
+    if request.method not in READ_METHODS or request.path.startswith('/admin'):
+        return False
+    return not recently_wrote(get_current_user_id())
+
+
+# Read-your-writes: tras escribir, el usuario lee del primario durante unos
+# segundos. Con una caché compartida la marca es visible para todos los
+# workers; si no, se guarda en este proceso.
+_recent_writes = {}
+
+def _shared_backend():
+    cache = current_app.extensions.get('response_cache') if has_app_context() else None
+    return cache.backend if cache is not None and cache.backend.shared else None
+
+def mark_recent_write(user_id):
+    window = current_app.config['READ_YOUR_WRITES_SECONDS']
+    backend = _shared_backend()
+    if backend is not None:
+        backend.set(f"rw:{user_id}", 1, ttl=window)
+    else:
+        _recent_writes[user_id] = time.monotonic() + window
+
+def recently_wrote(user_id):
+    backend = _shared_backend()
+    if backend is not None:
+        return backend.get(f"rw:{user_id}") is not None
+    until = _recent_writes.get(user_id)
+    return until is not None and until > time.monotonic()
+
+
+def init_replicas(app, db):
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', int(os.getenv('READ_YOUR_WRITES_SECONDS', 5)))
+    urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    if not urls:
+        app.extensions['db_replicas'] = None
+        return None
+
+    engines = []
+    for index, url in enumerate(urls):
+        url = url.replace("postgres://", "postgresql://")
+        engines.append(create_engine(url, **engine_options(url, name=f'replica-{index}')))
+    dispose_after_fork(engines)
+    replicas = app.extensions['db_replicas'] = ReplicaSet(engines, os.getenv('DB_REPLICA_STRATEGY', 'round_robin'))
+
+    @app.after_request
+    def remember_writer(response):
+        session = db.session()
+        if session.info.get('wrote'):
+            mark_recent_write(get_current_user_id())
+        return response
+
+    return replicas
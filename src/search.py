@@ -0,0 +1,151 @@
+import re
+from sqlalchemy import select, text, func, inspect, and_, or_, case, literal_column
+from .models import Character, Planet, Vehicle
+from .utils import APIException
+
+SEARCH_KINDS = {
+    'character': Character,
+    'planet': Planet,
+    'vehicle': Vehicle,
+}
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_TOKENS = 8
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Campos buscados, el nombre primero (más peso): iguales en todos los motores
+SEARCH_FIELDS = {
+    'character': ('name',),
+    'planet': ('name', 'terrain', 'climate'),
+    'vehicle': ('name', 'model', 'manufacturer'),
+}
+# Deben coincidir con las expresiones de los índices GIN (migración 3710ba2138ce)
+PG_VECTORS = {
+    'character': "to_tsvector('simple', coalesce(name, ''))",
+    'planet': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+              "setweight(to_tsvector('simple', coalesce(terrain, '') || ' ' || coalesce(climate, '')), 'B')",
+    'vehicle': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+               "setweight(to_tsvector('simple', coalesce(model, '') || ' ' || coalesce(manufacturer, '')), 'B')",
+}
+# En SQLite el rowid de catalog_search es id * 4 + código del tipo
+SQLITE_KIND_CODES = {'character': 1, 'planet': 2, 'vehicle': 3}
+
+_sqlite_fts_available = {}
+
+
+def parse_search_args(args):
+    tokens = TOKEN_RE.findall((args.get('q') or '').lower())[:MAX_TOKENS]
+    if not tokens:
+        raise APIException("'q' is required", status_code=400)
+
+    try:
+        limit = int(args.get('limit') or DEFAULT_SEARCH_LIMIT)
+    except ValueError:
+        raise APIException("'limit' must be an integer", status_code=400)
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    kinds = list(SEARCH_KINDS)
+    if args.get('types'):
+        kinds = [kind.strip() for kind in args['types'].split(',') if kind.strip()]
+        unknown = [kind for kind in kinds if kind not in SEARCH_KINDS]
+        if unknown:
+            raise APIException("Unknown type(s): " + ", ".join(unknown), status_code=400,
+                               payload={'allowed_types': list(SEARCH_KINDS)})
+    return tokens, kinds, limit
+
+
+def _postgres_matches(connection, tokens, kinds, limit):
+    # Cada palabra como prefijo ('tato:*'); los tokens son \w+, seguros para to_tsquery
+    query = " & ".join(f"{token}:*" for token in tokens)
+    matches = []
+    for kind in kinds:
+        vector = PG_VECTORS[kind]
+        stmt = text(f"SELECT id, ts_rank({vector}, query) AS score "
+                    f"FROM {SEARCH_KINDS[kind].__tablename__}, to_tsquery('simple', :query) AS query "
+                    f"WHERE {vector} @@ query ORDER BY score DESC, id LIMIT :limit")
+        matches += [(kind, row.id, float(row.score)) for row in connection.execute(stmt, {'query': query, 'limit': limit})]
+    return matches
+
+def _sqlite_matches(connection, tokens, kinds, limit):
+    match = " ".join(f'"{token}"*' for token in tokens)
+    codes = {SQLITE_KIND_CODES[kind]: kind for kind in kinds}
+    stmt = text("SELECT rowid, bm25(catalog_search, 10.0, 1.0) AS score FROM catalog_search "
+                f"WHERE catalog_search MATCH :match AND rowid % 4 IN ({', '.join(str(code) for code in codes)}) "
+                "ORDER BY score LIMIT :limit")
+    rows = connection.execute(stmt, {'match': match, 'limit': limit})
+    # bm25 es menor cuanto mejor: se invierte para que todas las puntuaciones crezcan
+    return [(codes[row.rowid % 4], row.rowid // 4, -float(row.score)) for row in rows]
+
+def _mysql_matches(connection, tokens, kinds, limit):
+    # Índices FULLTEXT (migración d81b3f6a9c47); '+tato*' exige cada palabra como prefijo
+    query = " ".join(f"+{token}*" for token in tokens)
+    matches = []
+    for kind in kinds:
+        fields = SEARCH_FIELDS[kind]
+        against = f"MATCH ({', '.join(fields)}) AGAINST (:query IN BOOLEAN MODE)"
+        # El nombre pesa más, como el peso 'A' de Postgres
+        score = against if len(fields) == 1 else f"10 * MATCH (name) AGAINST (:query IN BOOLEAN MODE) + {against}"
+        stmt = text(f"SELECT id, {score} AS score FROM {SEARCH_KINDS[kind].__tablename__} "
+                    f"WHERE {against} ORDER BY score DESC, id LIMIT :limit")
+        matches += [(kind, row.id, float(row.score)) for row in connection.execute(stmt, {'query': query, 'limit': limit})]
+    return matches
+
+def _word_prefix(column, token):
+    # Palabra que empieza por `token`: al principio del campo o tras un espacio
+    token = token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    column = func.lower(column)
+    return or_(column.like(token + "%", escape="\\"), column.like("% " + token + "%", escape="\\"))
+
+def _prefix_matches(connection, tokens, kinds, limit):
+    # Motores sin índice de texto (p. ej. SQLite creado con create_all, sin catalog_search):
+    # recorre la tabla con LIKE, con los mismos campos y la misma semántica de prefijos
+    matches = []
+    for kind in kinds:
+        model = SEARCH_KINDS[kind]
+        columns = [getattr(model, field) for field in SEARCH_FIELDS[kind]]
+        in_name = and_(*[_word_prefix(model.name, token) for token in tokens])
+        score = case((in_name, literal_column("1.0")), else_=literal_column("0.5")).label('score')
+        stmt = (select(model.id, score)
+                .where(*[or_(*[_word_prefix(column, token) for column in columns]) for token in tokens])
+                .order_by(score.desc(), model.name)
+                .limit(limit))
+        matches += [(kind, row.id, float(row.score)) for row in connection.execute(stmt)]
+    return matches
+
+def _has_sqlite_fts(connection):
+    key = str(connection.engine.url)
+    if key not in _sqlite_fts_available:
+        _sqlite_fts_available[key] = inspect(connection).has_table('catalog_search')
+    return _sqlite_fts_available[key]
+
+
+def search_catalog(connection, tokens, kinds, limit):
+    """Resultados de la búsqueda sobre `connection` (la de la sesión o, en modo ASGI, la del engine async)."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        matches = _postgres_matches(connection, tokens, kinds, limit)
+    elif dialect == 'sqlite' and _has_sqlite_fts(connection):
+        matches = _sqlite_matches(connection, tokens, kinds, limit)
+    elif dialect in ('mysql', 'mariadb'):
+        matches = _mysql_matches(connection, tokens, kinds, limit)
+    else:
+        matches = _prefix_matches(connection, tokens, kinds, limit)
+    matches = sorted(matches, key=lambda match: -match[2])[:limit]
+
+    # Una consulta IN (...) por tipo para traer las filas, respetando el ranking
+    ids_by_kind = {}
+    for kind, entity_id, _ in matches:
+        ids_by_kind.setdefault(kind, []).append(entity_id)
+    rows = {}
+    for kind, ids in ids_by_kind.items():
+        model = SEARCH_KINDS[kind]
+        fields = model.serialize_fields
+        stmt = select(*[getattr(model, name) for name in fields]).where(model.id.in_(ids))
+        for row in connection.execute(stmt):
+            rows[(kind, row[0])] = dict(zip(fields, row))
+
+    return [
+        {'type': kind, 'score': round(score, 6), **rows[(kind, entity_id)]}
+        for kind, entity_id, score in matches
+        if (kind, entity_id) in rows
+    ]
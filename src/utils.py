@@ -1,4 +1,16 @@
-from flask import jsonify, url_for
+import re
+import json
+import hashlib
+from flask import jsonify, url_for, request, Response
+from sqlalchemy import insert
+
+# <int(min=1):user_id>, <path:filename>, <name>
+RULE_VARIABLE_RE = re.compile(r"<(?:(\w+)(?:\((.*?)\))?:)?(\w+)>")
+CONVERTER_SCHEMAS = {
+    'int': {'type': 'integer'},
+    'float': {'type': 'number'},
+    'uuid': {'type': 'string', 'format': 'uuid'},
+}
 
 class APIException(Exception):
     status_code = 400
@@ -16,13 +28,72 @@ class APIException(Exception):
         rv['status_code'] = self.status_code
         return rv
 
+def get_current_user_id():
+    return 1  # Esto debe ser reemplazado por la lógica de autenticación real
+
+def insert_ignore_statement(model, dialect):
+    # INSERT ... ON CONFLICT DO NOTHING sobre la clave única de la tabla
+    # (los dialectos se importan aquí: cada proceso sólo carga el de su base de datos)
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects import sqlite
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return insert(model).prefix_with('IGNORE')
+    raise NotImplementedError(f"insert-or-ignore is not supported on {dialect}")
+
+def upsert_statement(model, dialect, columns, key=('id',), increment=()):
+    # INSERT ... ON CONFLICT (key) DO UPDATE: las filas existentes toman los valores nuevos
+    # de `columns` y suman los de `increment` (contadores: columna = columna + nuevo)
+    if dialect in ('postgresql', 'sqlite'):
+        from sqlalchemy.dialects import postgresql, sqlite
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(model)
+        new = stmt.excluded
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects import mysql
+        stmt = mysql.insert(model)
+        new = stmt.inserted
+    else:
+        raise NotImplementedError(f"upsert is not supported on {dialect}")
+    values = {column: new[column] for column in columns}
+    values.update({column: stmt.table.c[column] + new[column] for column in increment})
+    if dialect in ('mysql', 'mariadb'):
+        return stmt.on_duplicate_key_update(values)
+    return stmt.on_conflict_do_update(index_elements=list(key), set_=values)
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
+def _api_rules(app):
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint != 'static' and not rule.rule.startswith('/admin'):
+            yield rule
+
+def route_index(app):
+    """Índice de rutas legible por máquinas: ruta, endpoint, métodos y parámetros."""
+    routes = []
+    for rule in _api_rules(app):
+        parameters = []
+        for converter, arguments, name in RULE_VARIABLE_RE.findall(rule.rule):
+            schema = dict(CONVERTER_SCHEMAS.get(converter, {'type': 'string'}))
+            if arguments:
+                schema['converter_args'] = arguments
+            parameters.append({'name': name, 'in': 'path', 'required': True, 'schema': schema})
+        routes.append({
+            'path': rule.rule,
+            'endpoint': rule.endpoint,
+            'methods': sorted(rule.methods - {'HEAD', 'OPTIONS'}),
+            'parameters': parameters,
+        })
+    return {'routes': routes}
+
 def generate_sitemap(app):
-    links = ['/admin/']
+    # /admin sólo existe en el rol full
+    links = ['/admin/'] if 'admin' in app.extensions else []
     for rule in app.url_map.iter_rules():
         if "GET" in rule.methods and has_no_empty_params(rule):
             url = url_for(rule.endpoint, **(rule.defaults or {}))
@@ -38,3 +109,25 @@ def generate_sitemap(app):
         <p>Start working on your project by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+
+def _sitemap_documents(app):
+    # Las rutas no cambian tras el arranque: se generan en la primera visita y
+    # sólo se rehacen si se registran vistas nuevas (cambia el url map)
+    version = len(app.view_functions)
+    documents = app.extensions.get('sitemap')
+    if documents is None or documents['version'] != version:
+        html = generate_sitemap(app).encode()
+        index = json.dumps(route_index(app)).encode() + b"\n"
+        documents = app.extensions['sitemap'] = {
+            'version': version,
+            'html': (html, hashlib.sha1(html).hexdigest()[:20]),
+            'json': (index, hashlib.sha1(index).hexdigest()[:20]),
+        }
+    return documents
+
+def sitemap_response(app, kind='html'):
+    """Sitemap HTML (`/`) o índice de rutas JSON (`/routes`) ya generados."""
+    body, etag = _sitemap_documents(app)[kind]
+    response = Response(body, mimetype='text/html' if kind == 'html' else 'application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
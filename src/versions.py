@@ -0,0 +1,166 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import g, request, make_response, Response, has_request_context
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from .models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle, ResourceVersion
+from .pagination import wants_stream
+from .cache import get_cache, versions_changed
+from .utils import insert_ignore_statement
+
+VERSIONED_MODELS = (User, Character, Planet, Vehicle)
+FAVORITE_MODELS = (FavoriteCharacter, FavoritePlanet, FavoriteVehicle)
+CATALOG_KEYS = ('character', 'planet', 'vehicle')
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def favorites_version_key(user_id):
+    return f"favorites:{user_id}"
+
+def favorites_version_keys(user_id):
+    # La respuesta de favoritos cambia con los favoritos del usuario y con el catálogo
+    return ('user', favorites_version_key(user_id)) + CATALOG_KEYS
+
+def bump_versions(connection, keys, session=None):
+    now = _utcnow()
+    versions_changed(keys, session)
+    table = ResourceVersion.__table__
+    # Orden fijo para no provocar deadlocks entre transacciones concurrentes
+    for key in sorted(keys):
+        stmt = (update(table)
+                .where(table.c.key == key)
+                .values(version=table.c.version + 1, updated_at=now))
+        if connection.execute(stmt).rowcount:
+            continue
+        created = insert_ignore_statement(ResourceVersion, connection.dialect.name).values(
+            key=key, version=1, updated_at=now)
+        if not connection.execute(created).rowcount:
+            connection.execute(stmt)
+
+def bump_many_versions(connection, keys):
+    """Como `bump_versions` para muchas claves (p. ej. los favoritos de todos
+    los usuarios afectados por una carga): un UPDATE ... IN por tramo."""
+    now = _utcnow()
+    table = ResourceVersion.__table__
+    keys = sorted(set(keys))
+    versions_changed(keys)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        existing = set(connection.scalars(select(table.c.key).where(table.c.key.in_(chunk))))
+        if existing:
+            connection.execute(update(table)
+                               .where(table.c.key.in_(existing))
+                               .values(version=table.c.version + 1, updated_at=now))
+        # Las que aún no existen (pocas: una vez por clave) por el camino normal
+        bump_versions(connection, [key for key in chunk if key not in existing])
+
+def touch(*keys):
+    """Incrementa las versiones en la transacción actual (para escrituras Core)."""
+    bump_versions(db.session.connection(), keys)
+
+def current_version(keys):
+    # De la caché si está (ver ResponseCache.versions); de la base de datos sólo las que falten
+    cache = get_cache()
+    versions = cache.versions(keys) if cache is not None else {}
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        rows = db.session.execute(
+            select(ResourceVersion.key, ResourceVersion.version, ResourceVersion.updated_at)
+            .where(ResourceVersion.key.in_(missing))).all()
+        loaded = {key: (0, None) for key in missing}
+        loaded.update((row.key, (row.version, row.updated_at)) for row in rows)
+        if cache is not None:
+            cache.store_versions(loaded)
+        versions.update(loaded)
+    fingerprint = ",".join(f"{key}={versions[key][0]}" for key in keys)
+    etag = hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+    last_modified = max((updated_at for _, updated_at in versions.values() if updated_at), default=None)
+    return etag, last_modified
+
+def resource_version(keys):
+    """ETag de `keys` leído una sola vez por petición (antes que los datos).
+
+    `conditional` y las claves de la caché usan el mismo valor: un cuerpo
+    guardado bajo esta versión refleja como mínimo ese estado, aunque venga de
+    una réplica con retraso o de un refresco en segundo plano.
+    """
+    keys = tuple(keys)
+    if not has_request_context():
+        return current_version(keys)
+    versions = g.setdefault('resource_versions', {})
+    if keys not in versions:
+        versions[keys] = current_version(keys)
+    return versions[keys]
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # Comparación débil: al comprimir, el ETag se envía como W/"..."
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return request.if_modified_since.replace(tzinfo=None) >= last_modified.replace(microsecond=0)
+    return False
+
+def conditional(keys):
+    """Añade ETag/Last-Modified a una vista GET y responde 304 sin ejecutarla
+    cuando el cliente ya tiene la versión actual.
+
+    `keys` es una tupla de claves de versión o una función que las devuelve a
+    partir de los argumentos de la vista.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or wants_stream():
+                return view(*args, **kwargs)
+
+            resource_keys = keys(**kwargs) if callable(keys) else keys
+            etag, last_modified = resource_version(resource_keys)
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            return response
+        return wrapper
+    return decorator
+
+
+# Las escrituras ORM (API o Flask-Admin) apuntan las claves afectadas durante
+# el flush y se incrementan una sola vez por clave al terminarlo, dentro de la
+# misma transacción.
+def _schedule(session, key):
+    session.info.setdefault('version_bumps', set()).add(key)
+
+def _table_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _schedule(session, mapper.local_table.name)
+
+def _favorite_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _schedule(session, favorites_version_key(target.user_id))
+
+for _model in VERSIONED_MODELS:
+    event.listen(_model, 'after_insert', _table_changed)
+    event.listen(_model, 'after_update', _table_changed)
+    event.listen(_model, 'after_delete', _table_changed)
+
+for _model in FAVORITE_MODELS:
+    event.listen(_model, 'after_insert', _favorite_changed)
+    event.listen(_model, 'after_update', _favorite_changed)
+    event.listen(_model, 'after_delete', _favorite_changed)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _bump_after_flush(session, flush_context):
+    keys = session.info.pop('version_bumps', None)
+    if keys:
+        bump_versions(session.connection(), keys, session)
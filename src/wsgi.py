@@ -1,7 +1,10 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
-from .app import app as application
+# APP_ROLE=api para workers sólo de API (sin Flask-Admin ni migraciones)
+from .app import create_app
+
+application = create_app()
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,84 @@
+"""La app ASGI devuelve los mismos estados y cuerpos que la WSGI."""
+import asyncio
+import json
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.app import create_app
+from src.asgi import application
+from src.models import db, User, Character, Planet, Vehicle, FavoritePlanet
+from src.utils import get_current_user_id
+
+READS = [
+    '/people?limit=2',
+    '/people?ids=3,1,99',
+    '/planets?ids=x',
+    '/people?stream=1',
+    '/planets?stream=1&format=ndjson',
+    '/users?ids=1',
+    '/search?q=tat',
+    '/search',
+    '/users/favorites',
+]
+WRITES = [
+    ('POST', '/batch', {'items': [{'type': 'planet', 'id': 2}, {'type': 'vehicle', 'id': 7}, {'type': 'x', 'id': 1}]}),
+    ('POST', '/users/favorites/batch', {'favorites': [{'type': 'planet', 'id': 1}, {'type': 'planet', 'id': 1},
+                                                      {'type': 'character', 'id': 99}]}),
+    ('DELETE', '/users/favorites/batch', {'favorites': [{'type': 'planet', 'id': 2}, {'type': 'vehicle', 'id': 1}]}),
+    ('POST', '/users/favorites/batch', {'favorites': 'planet'}),
+]
+
+
+def seeded_app(path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}", 'CACHE_ENABLED': False,
+                      'COMPRESSION_ENABLED': False, 'RATELIMIT_ENABLED': False}, role='api')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=get_current_user_id(), username='user', email='user@example.com', password='x'))
+        for i in range(1, 4):
+            db.session.add_all([Character(id=i, name=f'Tatooine native {i}'), Planet(id=i, name=f'Planet {i}'),
+                                Vehicle(id=i, name=f'Vehicle {i}')])
+        db.session.add(FavoritePlanet(user_id=get_current_user_id(), planet_id=2))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    # Dos bases de datos iguales: una para cada app, así las escrituras se comparan una a una
+    seeded_app(tmp_path / 'asgi.db')
+    application.engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'asgi.db'}")
+    application.cache = None
+    yield seeded_app(tmp_path / 'wsgi.db')
+    asyncio.run(application.shutdown())
+    application.engine = None
+
+
+def asgi_request(method, path, body=None):
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'headers': []}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def wsgi_request(app, method, path, body=None):
+    response = app.test_client().open(path, method=method, json=body)
+    return response.status_code, response.get_data()
+
+
+@pytest.mark.parametrize('path', READS)
+def test_reads_match(app, path):
+    assert asgi_request('GET', path) == wsgi_request(app, 'GET', path)
+
+
+@pytest.mark.parametrize('method, path, body', WRITES)
+def test_writes_match(app, method, path, body):
+    assert asgi_request(method, path, body) == wsgi_request(app, method, path, body)
+    assert asgi_request('GET', '/users/favorites') == wsgi_request(app, 'GET', '/users/favorites')
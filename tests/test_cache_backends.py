@@ -0,0 +1,30 @@
+"""Los backends compartidos guardan los valores sin pickle."""
+import pickle
+import pytest
+from src.cache_backends import SQLiteBackend, CacheEntry, encode_value, decode_value
+
+
+@pytest.mark.parametrize('value', [
+    CacheEntry(1700000000.5, b'{"id":1}\n'),
+    CacheEntry(1700000000.5, (b'[{"id":1}]\n', 'eyJzIjoibmFtZSJ9')),
+    CacheEntry(1700000000.5, (b'[]\n', None)),
+    4242,
+])
+def test_values_round_trip(tmp_path, value):
+    assert decode_value(encode_value(value)) == value
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    backend.set('key', value)
+    assert backend.get('key') == value
+    assert backend.get_many(['key', 'missing']) == {'key': value}
+
+
+class Exploit:
+    def __reduce__(self):
+        return (pytest.fail, ("pickle payload was executed",))
+
+
+def test_pickle_payloads_are_misses(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    backend.set('key', 1)
+    backend._connection().execute("UPDATE cache_entry SET value = ?", (pickle.dumps(Exploit()),))
+    assert backend.get('key') is None
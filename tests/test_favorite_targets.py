@@ -0,0 +1,78 @@
+"""Alta de un favorito suelto: 400 si el id no es un entero y 404 si la entidad
+no existe, en la app WSGI y en la ASGI. En ningún caso se guarda nada."""
+import asyncio
+import json
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.app import create_app
+from src.asgi import application, Request
+from src.favorites import update_favorite_counts
+from src.models import db, User, Character, Planet, FavoriteCharacter, FavoritePlanet, FavoriteCount
+from src.utils import get_current_user_id
+
+CASES = [
+    # (ruta, cuerpo, estado)
+    ('/favorite/people', {'character_id': 'abc'}, 400),
+    ('/favorite/people', {'character_id': 99999}, 404),
+    ('/favorite/planet', {'planet_id': 'abc'}, 400),
+    ('/favorite/planet', {'planet_id': 99999}, 404),
+    ('/favorite/planet', {'planet_id': 1}, 201),
+]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'api.db'}", 'CACHE_ENABLED': False,
+                      'COMPRESSION_ENABLED': False, 'RATELIMIT_ENABLED': False}, role='api')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=get_current_user_id(), username='user', email='user@example.com', password='x'),
+                            Character(id=1, name='Character 1'), Planet(id=1, name='Planet 1')])
+        db.session.commit()
+    return app
+
+
+def stored_rows(app):
+    with app.app_context():
+        return [db.session.scalar(select(func.count()).select_from(model))
+                for model in (FavoriteCharacter, FavoritePlanet, FavoriteCount)]
+
+
+@pytest.fixture
+def asgi(app):
+    url = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite://', 'sqlite+aiosqlite://', 1)
+    application.engine, application.cache = create_async_engine(url), None
+    yield application
+    asyncio.run(application.shutdown())
+    application.engine = None
+
+
+def asgi_post(api, path, body):
+    scope = {'method': 'POST', 'path': path, 'query_string': b''}
+    response = asyncio.run(api.dispatch(Request(scope, json.dumps(body).encode())))
+    return response.status
+
+
+@pytest.mark.parametrize('path, body, status', CASES)
+def test_wsgi_favorite_target(app, path, body, status):
+    assert app.test_client().post(path, json=body).status_code == status
+    assert stored_rows(app) == ([0, 1, 1] if status == 201 else [0, 0, 0])
+
+
+@pytest.mark.parametrize('path, body, status', CASES)
+def test_asgi_favorite_target(app, asgi, path, body, status):
+    assert asgi_post(asgi, path, body) == status
+    assert stored_rows(app) == ([0, 1, 1] if status == 201 else [0, 0, 0])
+
+
+def test_counts_add_to_existing_rows(app):
+    # Otra transacción creó la fila entre medias: el alta suma en vez de perderse
+    with app.app_context():
+        connection = db.session.connection()
+        update_favorite_counts(connection, 'planet', {1: 1})
+        update_favorite_counts(connection, 'planet', {1: 1, 2: 1})
+        update_favorite_counts(connection, 'planet', {2: -1})
+        counts = dict(db.session.execute(select(FavoriteCount.entity_id, FavoriteCount.count)
+                                         .where(FavoriteCount.kind == 'planet')).all())
+    assert counts == {1: 2, 2: 0}
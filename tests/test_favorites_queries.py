@@ -0,0 +1,93 @@
+"""Número de sentencias SQL de los endpoints de favoritos.
+
+Fijo e independiente de cuántos favoritos tenga el usuario: un JOIN por tipo
+(o el documento precalculado de /users/favorites), nunca una consulta por fila.
+"""
+import pytest
+from sqlalchemy import event
+from src.app import create_app
+from src.models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
+from src.models import FavoritesDocument
+from src.favorites import build_favorites_documents
+from src.utils import get_current_user_id
+
+
+@pytest.fixture(params=[1, 10], ids=['1-favorite', '10-favorites'])
+def app(request):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CACHE_ENABLED': True, 'CACHE_BACKEND': 'memory',
+                      'COMPRESSION_ENABLED': False, 'RATELIMIT_ENABLED': False}, role='api')
+    user_id = get_current_user_id()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=user_id, username='user', email='user@example.com', password='x'))
+        for i in range(1, request.param + 1):
+            db.session.add_all([Character(id=i, name=f'Character {i}'), Planet(id=i, name=f'Planet {i}'),
+                                Vehicle(id=i, name=f'Vehicle {i}')])
+        db.session.flush()
+        for i in range(1, request.param + 1):
+            db.session.add_all([FavoriteCharacter(user_id=user_id, character_id=i),
+                                FavoritePlanet(user_id=user_id, planet_id=i),
+                                FavoriteVehicle(user_id=user_id, vehicle_id=i)])
+        db.session.commit()
+        # Como tras `flask favorites rebuild`: el documento ya existe
+        build_favorites_documents(db.session.connection(), [user_id])
+        db.session.commit()
+    # Sin contexto abierto: cada petición usa su propia sesión, como en producción
+    return app
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def get_counted(client, statements, path):
+    statements.clear()
+    response = client.get(path)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('path, cold, warm', [
+    # versiones (ETag) + usuario + documento; en caliente versiones y cuerpo salen de la caché
+    ('/users/favorites', 3, 1),
+    # versiones + usuario + un JOIN
+    ('/favorite/planets', 3, 1),
+    ('/favorite/people', 3, 1),
+])
+def test_favorites_query_count(app, statements, path, cold, warm):
+    client = app.test_client()
+    assert get_counted(client, statements, path) == cold
+    assert get_counted(client, statements, path) == warm
+
+
+def test_stale_document_is_not_written_on_read(app, statements):
+    # Sin documento al día la lectura lo genera al vuelo, sin escribir en la base de datos
+    with app.app_context():
+        db.session.execute(FavoritesDocument.__table__.delete())
+        db.session.commit()
+    statements.clear()
+    response = app.test_client().get('/users/favorites')
+    assert response.status_code == 200
+    assert len(response.json['favorite_planets']) == len(response.json['favorite_characters']) > 0
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith(('INSERT', 'UPDATE'))]
+
+
+def test_write_changes_cached_version(app, statements):
+    # La escritura borra la versión guardada: la siguiente lectura trae el ETag nuevo
+    client = app.test_client()
+    etag = client.get('/favorite/planets').headers['ETag']
+    assert client.get('/favorite/planets').headers['ETag'] == etag
+    assert client.delete('/favorite/planet/1').status_code == 200
+    response = client.get('/favorite/planets')
+    assert response.headers['ETag'] != etag
+    assert 1 not in [planet['id'] for planet in response.json]
@@ -0,0 +1,33 @@
+"""`ingest` desde un volcado local: cuenta sólo las filas escritas y descarta
+(con un aviso) los elementos con un id no numérico sin `url` de la que sacarlo."""
+import json
+import pytest
+from sqlalchemy import select
+from src.app import create_app
+from src.ingest import ingest, file_pages
+from src.models import db, Planet
+
+
+@pytest.fixture
+def app():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CACHE_ENABLED': False,
+                      'COMPRESSION_ENABLED': False, 'RATELIMIT_ENABLED': False}, role='api')
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_ingest_counts_written_rows(app, tmp_path, caplog):
+    dump = tmp_path / 'planets.json'
+    dump.write_text(json.dumps([
+        {'id': 1, 'name': 'Tatooine'},
+        {'id': '1', 'name': 'Tatooine (dup)'},                                    # gana la última aparición
+        {'uid': 'abc', 'name': 'Alderaan', 'url': 'https://swapi.dev/api/planets/2/'},  # id de la url
+        {'id': 'abc', 'name': 'Broken'},                                          # se descarta
+        {'name': 'Yavin IV'},                                                     # sin id: INSERT normal
+    ]))
+    rows = ingest(Planet, file_pages(str(dump), 'planets'))
+    names = db.session.scalars(select(Planet.name).order_by(Planet.id)).all()
+    assert rows == 3
+    assert names == ['Tatooine (dup)', 'Alderaan', 'Yavin IV']
+    assert "invalid id 'abc'" in caplog.text
@@ -0,0 +1,32 @@
+"""Búsqueda sin índice de texto (LIKE): mismos campos que las de Postgres,
+SQLite FTS5 y MySQL, cada palabra como prefijo y el nombre con más peso."""
+import pytest
+from src.app import create_app
+from src.models import db, Character, Planet, Vehicle
+from src.search import search_catalog
+
+
+@pytest.fixture
+def connection():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CACHE_ENABLED': False,
+                      'COMPRESSION_ENABLED': False, 'RATELIMIT_ENABLED': False}, role='api')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Character(id=1, name='Luke Skywalker'),
+                            Planet(id=1, name='Tatooine', terrain='desert', climate='arid'),
+                            Planet(id=2, name='Desert World', terrain='rock', climate='temperate'),
+                            Vehicle(id=1, name='Sand Crawler', model='Digger Crawler', manufacturer='Corellia Mining')])
+        db.session.commit()
+        yield db.session.connection()
+
+
+@pytest.mark.parametrize('tokens, expected', [
+    (['sky'], [('character', 1)]),
+    (['desert'], [('planet', 2), ('planet', 1)]),   # el nombre antes que el terreno
+    (['arid', 'tat'], [('planet', 1)]),
+    (['mining'], [('vehicle', 1)]),
+    (['ining'], []),                                 # prefijos de palabra, no subcadenas
+])
+def test_prefix_search_fields(connection, tokens, expected):
+    results = search_catalog(connection, tokens, ['character', 'planet', 'vehicle'], 10)
+    assert [(result['type'], result['id']) for result in results] == expected